@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 import argparse
+import functools
 import os
 import re
 import shutil
 import sys
 import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
 from html.parser import HTMLParser
 from io import StringIO
 from pathlib import Path
+from typing import ClassVar
 
 from qgis.core import (
     Qgis,
@@ -45,18 +49,11 @@ from qgis.core import (
 )
 from qgis.PyQt.QtCore import QMetaType, QObject, QSize, pyqtSignal
 
-try:
-    import markdown
-except ImportError:
-    pass
-
 
 class HTMLStripper(HTMLParser):
     def __init__(self):
-        super().__init__()
-        self.reset()
+        super().__init__(convert_charrefs=True)
         self.strict = False
-        self.convert_charrefs = True
         self.text = StringIO()
 
     def handle_data(self, data):
@@ -66,12 +63,92 @@ class HTMLStripper(HTMLParser):
         return self.text.getvalue()
 
 
+@functools.lru_cache(maxsize=8192)
 def strip_tags(html):
+    # Plain text labels are by far the most common, skip the HTML parser for those
+    if "<" not in html and "&" not in html:
+        return html
+
     s = HTMLStripper()
     s.feed(html)
     return s.get_data()
 
 
+@functools.cache
+def default_editor_widget(widget_type):
+    """
+    Returns an editor widget setup of the given type without configuration.
+    Widget setups are immutable values, a single one is shared per type.
+    """
+    return QgsEditorWidgetSetup(widget_type, {})
+
+
+def row_value(row, index):
+    """
+    Returns the stripped string value of a sheet row cell, or an empty string
+    when the column is missing or the cell is empty.
+    """
+    if index < 0:
+        return ""
+
+    value = row[index]
+    return str(value).strip() if value else ""
+
+
+def is_number(value):
+    """
+    Returns whether the value is an unsigned number made of digits with at most
+    one decimal point.
+    """
+    integer, _, fraction = value.partition(".")
+    if not integer and not fraction:
+        return False
+
+    return (not integer or integer.isdigit()) and (not fraction or fraction.isdigit())
+
+
+def header_indexes(fields):
+    """
+    Maps the stripped and lower-cased header names of a sheet to their column
+    index. When a header is repeated, the first occurrence wins.
+    """
+    indexes = {}
+    for index, field in enumerate(fields):
+        indexes.setdefault(str(field).strip().lower(), index)
+    return indexes
+
+
+def square_extent(extent):
+    """
+    Returns the largest square fitting in the extent, sharing its center.
+    """
+    x_minimum = extent.xMinimum()
+    x_maximum = extent.xMaximum()
+    y_minimum = extent.yMinimum()
+    y_maximum = extent.yMaximum()
+    half_size = min(x_maximum - x_minimum, y_maximum - y_minimum) / 2
+    x_center = (x_minimum + x_maximum) / 2
+    y_center = (y_minimum + y_maximum) / 2
+    return QgsRectangle(
+        x_center - half_size,
+        y_center - half_size,
+        x_center + half_size,
+        y_center + half_size,
+    )
+
+
+@dataclass(slots=True)
+class FormFrame:
+    """
+    Editor form state of a survey layer being built, one per nested repeat.
+    """
+
+    layer: QgsVectorLayer
+    form: QgsEditFormConfig
+    containers: list[QgsAttributeEditorContainer]
+    group_level: int = 0
+
+
 class XLSFormConverter(QObject):
     xlsx_form_file = ""
 
@@ -79,7 +156,22 @@ class XLSFormConverter(QObject):
     choices_layer: QgsVectorLayer | None = None
     settings_layer: QgsVectorLayer | None = None
 
+    survey_fields: list[str]
+    survey_rows: list[list]
+    survey_types: list[str]
+    survey_type_details: list[list[str]]
+    survey_names: list[str]
+    survey_child_rows: dict[str | None, list[int]]
+    survey_child_geometries: dict[str | None, Qgis.WkbType]
+    choices_fields: list[str]
+    choices_lists: dict[str, list[list]]
+    settings_fields: list[str]
+    settings_rows: list[list]
+
     output_field = None
+    output_file_exists = False
+    output_project_write_connected = False
+    defer_expression_validation = False
     output_extent = None
     output_project: QgsProject
 
@@ -118,7 +210,14 @@ class XLSFormConverter(QObject):
     settings_form_id_index = -1
     settings_default_language_index = -1
 
-    calculate_expressions: dict[str, str] = {}
+    calculate_expressions: dict[str, str]
+    calculate_names_re: re.Pattern | None = None
+    expression_cache: dict[tuple, str]
+    pending_expressions: dict[str, tuple[str, str]]
+    layer_specs: dict[str | None, tuple[Qgis.WkbType, QgsFields]]
+    list_layers: dict[str, QgsVectorLayer]
+    value_relation_widgets: dict[tuple, QgsEditorWidgetSetup]
+    emitted_warnings: set[str]
 
     multimedia_info_pushed = False
     barcode_info_pushed = False
@@ -127,41 +226,133 @@ class XLSFormConverter(QObject):
     warning = pyqtSignal(str)
     error = pyqtSignal(str)
 
-    FIELD_TYPES = [
-        "integer",
-        "decimal",
-        "range",
-        "date",
-        "time",
-        "datetime",
-        "text",
-        "barcode",
-        "image",
-        "audio",
-        "background-audio",
-        "video",
-        "file",
-        "select_one",
-        "select_one_from_file",
-        "select_multiple",
-        "select_multiple_from_file",
-        "acknowledge",
-        "rank",
-        "calculate",
-        "hidden",
-    ]
-    METADATA_TYPES = [
-        "start",
-        "end",
-        "today",
-        "deviceid",
-        "phonenumber",
-        "username",
-        "email",
-        "audit",
-    ]
-
-    BASEMAPS = {
+    FIELD_TYPES = frozenset(
+        [
+            "integer",
+            "decimal",
+            "range",
+            "date",
+            "time",
+            "datetime",
+            "text",
+            "barcode",
+            "image",
+            "audio",
+            "background-audio",
+            "video",
+            "file",
+            "select_one",
+            "select_one_from_file",
+            "select_multiple",
+            "select_multiple_from_file",
+            "acknowledge",
+            "rank",
+            "calculate",
+            "hidden",
+        ]
+    )
+    METADATA_TYPES = frozenset(
+        [
+            "start",
+            "end",
+            "today",
+            "deviceid",
+            "phonenumber",
+            "username",
+            "email",
+            "audit",
+        ]
+    )
+
+    SUPPORTED_TYPES = FIELD_TYPES | METADATA_TYPES
+
+    BEGIN_REPEAT_TYPES = frozenset(["begin repeat", "begin_repeat"])
+    END_REPEAT_TYPES = frozenset(["end repeat", "end_repeat"])
+    BEGIN_GROUP_TYPES = frozenset(["begin group", "begin_group"])
+    END_GROUP_TYPES = frozenset(["end group", "end_group"])
+    CALCULATED_TYPES = frozenset(["calculate", "hidden"])
+    AUTOMATIC_METADATA_TYPES = frozenset(["today", "start", "end", "username", "email"])
+
+    FIELD_TYPE_QMETATYPES: ClassVar[dict] = {
+        "integer": QMetaType.Type.LongLong,
+        "decimal": QMetaType.Type.Double,
+        "range": QMetaType.Type.Double,
+        "date": QMetaType.Type.QDate,
+        "today": QMetaType.Type.QDate,
+        "time": QMetaType.Type.QTime,
+        "datetime": QMetaType.Type.QDateTime,
+        "start": QMetaType.Type.QDateTime,
+        "end": QMetaType.Type.QDateTime,
+        "acknowledge": QMetaType.Type.Bool,
+        "text": QMetaType.Type.QString,
+        "barcode": QMetaType.Type.QString,
+        "image": QMetaType.Type.QString,
+        "audio": QMetaType.Type.QString,
+        "background-audio": QMetaType.Type.QString,
+        "video": QMetaType.Type.QString,
+        "file": QMetaType.Type.QString,
+        "select_one": QMetaType.Type.QString,
+        "select_one_from_file": QMetaType.Type.QString,
+        "select_multiple": QMetaType.Type.QString,
+        "select_multiple_from_file": QMetaType.Type.QString,
+        "username": QMetaType.Type.QString,
+        "email": QMetaType.Type.QString,
+        "calculate": QMetaType.Type.QString,
+        "hidden": QMetaType.Type.QString,
+    }
+    GEOMETRY_TYPES: ClassVar[dict] = {
+        "geopoint": Qgis.WkbType.MultiPoint,
+        "start-geopoint": Qgis.WkbType.MultiPoint,
+        "geotrace": Qgis.WkbType.MultiLineString,
+        "start-geotrace": Qgis.WkbType.MultiLineString,
+        "geoshape": Qgis.WkbType.MultiPolygon,
+        "start-geoshape": Qgis.WkbType.MultiPolygon,
+    }
+    DATETIME_FORMATS: ClassVar[dict] = {
+        "date": "yyyy-MM-dd",
+        "time": "HH:mm:ss",
+        "datetime": "yyyy-MM-dd HH:mm:ss",
+    }
+    MULTIMEDIA_TYPES = frozenset(
+        [
+            "image",
+            "audio",
+            "background-audio",
+            "video",
+        ]
+    )
+    DOCUMENT_VIEWERS: ClassVar[dict] = {
+        "file": 0,
+        "image": 1,
+        "audio": 3,
+        "background-audio": 3,
+        "video": 4,
+    }
+
+    RANGE_START_RE = re.compile(r"start=\s*([0-9]+)", re.IGNORECASE)
+    RANGE_END_RE = re.compile(r"end=\s*([0-9]+)", re.IGNORECASE)
+    RANGE_STEP_RE = re.compile(r"step=\s*([0-9]+)", re.IGNORECASE)
+    MAX_PIXELS_RE = re.compile(r"max-pixels=\s*([0-9]+)", re.IGNORECASE)
+    PARAMETER_VALUE_RE = re.compile(r"value\s*=\s*(\S*)")
+    PARAMETER_LABEL_RE = re.compile(r"label\s*=\s*(\S*)")
+    FIELD_REFERENCE_RE = re.compile(r"\$\{([^}]+)}")
+    LABEL_TOKEN_RE = re.compile(r"\$\{([^}]+)}|'")
+    DOT_REFERENCE_RE = re.compile(r"(^|[\s<>=\(\)\,])\.($|[\s<>=\(\)\,])")
+    SELECTED_RE = re.compile(r"selected\s*\(\s*(\$\{[^}]+})\,([^)]+)\)")
+    REGEX_CALL_RE = re.compile(r"regex\s*\(\s*(\$\{[^}]+})\s*\,\s*'(.+)'\s*\)\s*$")
+    POSIX_CLASS_RE = re.compile(
+        r"([^\[])\[:(digit|upper|lower|alpha|alnum|punct|blank|word):\]([^\]])"
+    )
+    TODAY_RE = re.compile(r"today\(\)")
+    STRING_LENGTH_RE = re.compile(r"string-length\s*\(\s*([^\)]+)\)")
+    FILENAME_INVALID_RE = re.compile(r"[^\w\s-]")
+    FILENAME_SEPARATORS_RE = re.compile(r"[-\s]+")
+    MARKDOWN_SYNTAX_RE = re.compile(r"[*_`\[\]#>!<&\\\n]|^\s*(?:[-+]|\d+\.)\s")
+    QUOTES_TRANSLATION = str.maketrans({"‘": "'", "’": "'"})
+
+    CHOICES_WRITE_BATCH_SIZE = 10000
+
+    BASEMAPS: ClassVar[dict] = {
         "OpenStreetMap": "type=xyz&tilePixelRatio=1&url=https://tile.openstreetmap.org/%7Bz%7D/%7Bx%7D/%7By%7D.png&zmax=19&zmin=0&crs=EPSG3857",
         "HOT": "type=xyz&tilePixelRatio=1&url=https://a.tile.openstreetmap.fr/hot/%7Bz%7D/%7Bx%7D/%7By%7D.png&zmax=19&zmin=0&crs=EPSG3857",
     }
@@ -169,103 +360,211 @@ class XLSFormConverter(QObject):
     def __init__(self, xlsx_form_file):
         QObject.__init__(self)
         self.crs = QgsCoordinateReferenceSystem("EPSG:3857")
+        self.survey_fields = []
+        self.survey_rows = []
+        self.survey_types = []
+        self.survey_type_details = []
+        self.survey_names = []
+        self.survey_child_rows = {}
+        self.survey_child_geometries = {}
+        self.choices_fields = []
+        self.choices_lists = {}
+        self.settings_fields = []
+        self.settings_rows = []
+        self.calculate_expressions = {}
+        self.layer_specs = {}
+        self.expression_cache = {}
+        self.pending_expressions = {}
+        self.emitted_warnings = set()
 
         if not os.path.isfile(xlsx_form_file):
             return
 
         self.xlsx_form_file = xlsx_form_file
 
-        self.survey_layer = QgsVectorLayer(
-            xlsx_form_file
-            + "|layername=survey|option:FIELD_TYPES=STRING|option:HEADERS=FORCE",
-            "survey",
-            "ogr",
-        )
+        self.survey_layer = self.open_sheet(xlsx_form_file, "survey", "survey")
         if self.survey_layer.isValid():
-            fields = self.survey_layer.fields().names()
-            if fields[0] == "Field1":
-                self.survey_skip_first = True
-                fields = self.survey_layer.getFeature(1).attributes()
-
-            self.survey_type_index = fields.index("type") if "type" in fields else -1
-            self.survey_name_index = fields.index("name") if "name" in fields else -1
-            self.survey_label_index = fields.index("label") if "label" in fields else -1
-            self.survey_calculation_index = (
-                fields.index("calculation") if "calculation" in fields else -1
-            )
-            self.survey_relevant_index = (
-                fields.index("relevant") if "relevant" in fields else -1
-            )
-            self.survey_choice_filter_index = (
-                fields.index("choice_filter") if "choice_filter" in fields else -1
-            )
-            self.survey_parameters_index = (
-                fields.index("parameters") if "parameters" in fields else -1
-            )
-            self.survey_constraint_index = (
-                fields.index("constraint") if "constraint" in fields else -1
+            (
+                self.survey_fields,
+                self.survey_rows,
+                self.survey_skip_first,
+            ) = self.read_sheet(
+                self.survey_layer,
+                QgsFeatureRequest().setFlags(Qgis.FeatureRequestFlag.NoGeometry),
             )
-            self.survey_constraint_message_index = (
-                fields.index("constraint_message")
-                if "constraint_message" in fields
-                else -1
-            )
-            self.survey_required_index = (
-                fields.index("required") if "required" in fields else -1
-            )
-            self.survey_default_index = (
-                fields.index("default") if "default" in fields else -1
-            )
-            self.survey_read_only_index = (
-                fields.index("read_only") if "read_only" in fields else -1
+
+            indexes = header_indexes(self.survey_fields)
+            self.survey_type_index = indexes.get("type", -1)
+            self.survey_name_index = indexes.get("name", -1)
+            self.survey_label_index = indexes.get("label", -1)
+            self.survey_calculation_index = indexes.get("calculation", -1)
+            self.survey_relevant_index = indexes.get("relevant", -1)
+            self.survey_choice_filter_index = indexes.get("choice_filter", -1)
+            self.survey_parameters_index = indexes.get("parameters", -1)
+            self.survey_constraint_index = indexes.get("constraint", -1)
+            self.survey_constraint_message_index = indexes.get("constraint_message", -1)
+            self.survey_required_index = indexes.get("required", -1)
+            self.survey_default_index = indexes.get("default", -1)
+            self.survey_read_only_index = indexes.get("read_only", -1)
+            self.survey_trigger_index = indexes.get("trigger", -1)
+
+            self.read_survey_columns()
+            self.index_survey_children()
+
+        self.choices_layer = self.open_sheet(xlsx_form_file, "choices", "options")
+        if self.choices_layer.isValid():
+            (
+                self.choices_fields,
+                choices_rows,
+                self.choices_skip_first,
+            ) = self.read_sheet(
+                self.choices_layer,
+                QgsFeatureRequest().setFlags(Qgis.FeatureRequestFlag.NoGeometry),
             )
-            self.survey_trigger_index = (
-                fields.index("trigger") if "trigger" in fields else -1
+
+            indexes = header_indexes(self.choices_fields)
+            self.choices_list_name_index = indexes.get(
+                "list_name", indexes.get("list name", -1)
             )
+            self.choices_name_index = indexes.get("name", -1)
+            self.choices_label_index = indexes.get("label", -1)
 
-        self.choices_layer = QgsVectorLayer(
-            xlsx_form_file
-            + "|layername=choices|option:FIELD_TYPES=STRING|option:HEADERS=FORCE",
-            "options",
-            "ogr",
-        )
-        if self.choices_layer.isValid():
-            fields = self.choices_layer.fields().names()
-            if fields[0] == "Field1":
-                self.choices_skip_first = True
-                fields = self.choices_layer.getFeature(1).attributes()
+            self.group_choices(choices_rows)
 
-            self.choices_list_name_index = (
-                fields.index("list_name") if "list_name" in fields else -1
+        self.settings_layer = self.open_sheet(xlsx_form_file, "settings", "settings")
+        if self.settings_layer.isValid():
+            (
+                self.settings_fields,
+                self.settings_rows,
+                self.settings_skip_first,
+            ) = self.read_sheet(
+                self.settings_layer,
+                # Only the first settings row is used, which may follow a header row
+                QgsFeatureRequest()
+                .setFlags(Qgis.FeatureRequestFlag.NoGeometry)
+                .setLimit(2),
             )
-            if self.choices_list_name_index == -1:
-                self.choices_list_name_index = (
-                    fields.index("list name") if "list name" in fields else -1
-                )
-            self.choices_name_index = fields.index("name") if "name" in fields else -1
-            self.choices_name_index = fields.index("label") if "label" in fields else -1
 
-        self.settings_layer = QgsVectorLayer(
+            indexes = header_indexes(self.settings_fields)
+            self.settings_form_title_index = indexes.get("form_title", -1)
+            self.settings_form_id_index = indexes.get("form_id", -1)
+            self.settings_default_language_index = indexes.get("default_language", -1)
+
+    def open_sheet(self, xlsx_form_file, sheet_name, layer_name):
+        """
+        Opens a sheet of the XLSForm file as a string-typed OGR layer. The sheet
+        is only read from, so the default style lookup done on layer load is skipped.
+        """
+        layer_options = QgsVectorLayer.LayerOptions()
+        layer_options.loadDefaultStyle = False
+
+        return QgsVectorLayer(
             xlsx_form_file
-            + "|layername=settings|option:FIELD_TYPES=STRING|option:HEADERS=FORCE",
-            "settings",
+            + "|layername="
+            + sheet_name
+            + "|option:FIELD_TYPES=STRING|option:HEADERS=FORCE",
+            layer_name,
             "ogr",
+            layer_options,
         )
-        if self.settings_layer.isValid():
-            fields = self.settings_layer.fields().names()
-            if fields[0] == "Field1":
-                self.settings_skip_first = True
-                fields = self.settings_layer.getFeature(1).attributes()
 
-            self.settings_form_title_index = (
-                fields.index("form_title") if "form_title" in fields else -1
-            )
-            self.settings_form_id_index = (
-                fields.index("form_id") if "form_id" in fields else -1
-            )
-            self.settings_default_language_index = (
-                fields.index("default_language") if "default_language" in fields else -1
-            )
+    def read_sheet(self, layer, request=None):
+        """
+        Reads all the features of a sheet layer once, returning its header, its
+        rows and whether the header was found in the first feature. When OGR did
+        not pick up the header row, the first feature is taken from the same
+        iterator instead of seeking back into the file for it.
+        """
+        fields = layer.fields().names()
+        skip_first = False
+
+        it = layer.getFeatures(request if request is not None else QgsFeatureRequest())
+        if fields and fields[0] == "Field1":
+            skip_first = True
+            feature = QgsFeature()
+            if it.nextFeature(feature):
+                fields = [str(value) if value else "" for value in feature.attributes()]
+
+        rows = [feature.attributes() for feature in it]  # type: ignore
+        return fields, rows, skip_first
+
+    def read_survey_columns(self):
+        """
+        Extracts the type and name columns of the survey rows into parallel lists,
+        parsing each type once so that the conversion passes can index into them.
+        The leading type token is interned as it gets compared against the type
+        vocabulary for every row.
+        """
+        self.survey_types = []
+        self.survey_type_details = []
+        self.survey_names = []
+
+        for row in self.survey_rows:
+            type_value = row_value(row, self.survey_type_index)
+            type_details = type_value.split(" ")
+            type_details[0] = sys.intern(type_details[0].lower())
+
+            self.survey_types.append(type_value.lower())
+            self.survey_type_details.append(type_details)
+            self.survey_names.append(row_value(row, self.survey_name_index))
+
+    def index_survey_children(self):
+        """
+        Bins the survey row indexes by the repeat they directly belong to, with
+        None for rows of the root survey layer. Repeat delimiters are left out.
+
+        The geometry of each layer, given by its first geometry question, is
+        recorded in the same pass.
+        """
+        self.survey_child_rows = {None: []}
+        self.survey_child_geometries = {}
+
+        current_child_name = []
+        for index, feature_type in enumerate(self.survey_types):
+            if feature_type in self.BEGIN_REPEAT_TYPES:
+                current_child_name.append(self.survey_names[index])
+                if self.survey_names[index] not in self.survey_child_rows:
+                    self.survey_child_rows[self.survey_names[index]] = []
+            elif feature_type in self.END_REPEAT_TYPES:
+                if len(current_child_name) > 0:
+                    current_child_name.pop()
+            else:
+                child_name = current_child_name[-1] if current_child_name else None
+                self.survey_child_rows[child_name].append(index)
+
+                if child_name not in self.survey_child_geometries:
+                    geometry = self.GEOMETRY_TYPES.get(
+                        self.survey_type_details[index][0]
+                    )
+                    if geometry is not None:
+                        self.survey_child_geometries[child_name] = geometry
+
+    def group_choices(self, rows):
+        """
+        Groups the choices rows by list name, preserving the sheet order. Only the
+        grouped rows are kept, rows without a list name are dropped.
+        """
+        choices_lists = defaultdict(list)
+
+        for row in rows:
+            list_name = row_value(row, self.choices_list_name_index)
+            if list_name:
+                choices_lists[list_name].append(row)
+
+        self.choices_lists = dict(choices_lists)
+
+    @functools.cached_property
+    def markdown(self):
+        """
+        Returns the optional markdown module, imported on first use as it is
+        only needed for forms containing notes. Returns None when unavailable.
+        """
+        try:
+            import markdown
+        except ImportError:
+            return None
+
+        return markdown
 
     def is_valid(self):
         # Missing the one layer that must be available
@@ -282,160 +581,96 @@ class XLSFormConverter(QObject):
 
         return True
 
-    def create_field(self, feature):
-        if not feature.attribute(self.survey_type_index) or not feature.attribute(
-            self.survey_name_index
-        ):
+    def create_field(self, index):
+        if not self.survey_types[index] or not self.survey_names[index]:
             return None
 
-        type_details = str(feature.attribute(self.survey_type_index)).split(" ")
-        type_details[0] = type_details[0].lower()
+        row = self.survey_rows[index]
+        type_details = self.survey_type_details[index]
 
-        field_name = str(feature.attribute(self.survey_name_index)).strip()
-        field_alias = (
-            str(feature.attribute(self.survey_label_index)).strip()
-            if feature.attribute(self.survey_label_index)
-            else field_name
-        )
+        field_name = self.survey_names[index]
+        field_alias = row_value(row, self.survey_label_index) or field_name
         field_alias = strip_tags(field_alias)
 
-        field_type = None
         field = None
+        field_type = self.FIELD_TYPE_QMETATYPES.get(type_details[0])
 
-        if type_details[0] == "integer":
-            field_type = QMetaType.Type.LongLong
-        elif type_details[0] == "decimal":
-            field_type = QMetaType.Type.Double
-        elif type_details[0] == "range":
-            field_type = QMetaType.Type.Double
-        elif type_details[0] == "date" or type_details[0] == "today":
-            field_type = QMetaType.Type.QDate
-        elif type_details[0] == "time":
-            field_type = QMetaType.Type.QTime
-        elif (
-            type_details[0] == "datetime"
-            or type_details[0] == "start"
-            or type_details[0] == "end"
-        ):
-            field_type = QMetaType.Type.QDateTime
-        elif type_details[0] == "acknowledge":
-            field_type = QMetaType.Type.Bool
-        elif (
-            type_details[0] == "text"
-            or type_details[0] == "barcode"
-            or type_details[0] == "image"
-            or type_details[0] == "audio"
-            or type_details[0] == "background-audio"
-            or type_details[0] == "video"
-            or type_details[0] == "file"
-            or type_details[0] == "select_one"
-            or type_details[0] == "select_one_from_file"
-            or type_details[0] == "select_multiple"
-            or type_details[0] == "select_multiple_from_file"
-            or type_details[0] == "username"
-            or type_details[0] == "email"
-        ):
-            field_type = QMetaType.Type.QString
-
-            if type_details[0] == "barcode":
-                if not self.barcode_info_pushed:
-                    self.info.emit(
-                        self.tr(
-                            "Barcode functionality is only available through QField; it will be a simple text field in QGIS"
-                        )
-                    )
-                    self.barcode_info_pushed = True
-            elif (
-                type_details[0] == "image"
-                or type_details[0] == "audio"
-                or type_details[0] == "video"
-                or type_details[0] == "background-audio"
-            ):
-                if type_details[0] == "background-audio":
-                    self.warning.emit(
-                        self.tr(
-                            "Unsupported type background-audio, using audio instead"
-                        )
+        if type_details[0] == "barcode":
+            if not self.barcode_info_pushed:
+                self.info.emit(
+                    self.tr(
+                        "Barcode functionality is only available through QField; it will be a simple text field in QGIS"
                     )
+                )
+                self.barcode_info_pushed = True
+        elif type_details[0] in self.MULTIMEDIA_TYPES:
+            if type_details[0] == "background-audio":
+                self.warning.emit(
+                    self.tr("Unsupported type background-audio, using audio instead")
+                )
 
-                if not self.multimedia_info_pushed:
-                    self.info.emit(
-                        self.tr(
-                            "Multimedia content can be captured using QField on devices with cameras and microphones; in QGIS, pre-existing files can be selected."
-                        )
-                    )
-                    self.multimedia_info_pushed = True
-            elif type_details[0] == "username" or type_details[0] == "email":
+            if not self.multimedia_info_pushed:
                 self.info.emit(
                     self.tr(
-                        "The metadata {} is only available through QFieldCloud; it will return an empty value in QGIS".format(
-                            type_details[0]
-                        )
+                        "Multimedia content can be captured using QField on devices with cameras and microphones; in QGIS, pre-existing files can be selected."
                     )
                 )
-        elif type_details[0] == "calculate" or type_details[0] == "hidden":
-            field_type = QMetaType.Type.QString
-
-            if self.survey_calculation_index >= 0:
-                field_calculation = (
-                    str(feature.attribute(self.survey_calculation_index)).strip()
-                    if feature.attribute(self.survey_calculation_index)
-                    else ""
+                self.multimedia_info_pushed = True
+        elif type_details[0] == "username" or type_details[0] == "email":
+            self.info.emit(
+                self.tr(
+                    "The metadata {} is only available through QFieldCloud; it will return an empty value in QGIS".format(
+                        type_details[0]
+                    )
                 )
-                if field_calculation != "":
-                    self.calculate_expressions[field_name] = field_calculation
-
-        if field_type:
+            )
+        elif type_details[0] in self.CALCULATED_TYPES:
+            field_calculation = row_value(row, self.survey_calculation_index)
+            if field_calculation != "":
+                self.calculate_expressions[field_name] = field_calculation
+                # Converted expressions may have inlined calculations
+                self.calculate_names_re = None
+                self.expression_cache = {}
+
+        if field_type is not None:
             field = QgsField(field_name, field_type)
             field.setAlias(field_alias)
 
+            field_constraint_expression = row_value(row, self.survey_constraint_index)
+            field_required = row_value(row, self.survey_required_index).lower()
+            if field_constraint_expression == "" and field_required != "yes":
+                # Fields are created without constraints, nothing to set up
+                return field
+
             field_constraints = QgsFieldConstraints()
 
-            if self.survey_constraint_index >= 0:
-                field_constraint_expression = (
-                    str(feature.attribute(self.survey_constraint_index)).strip()
-                    if feature.attribute(self.survey_constraint_index)
-                    else ""
+            if field_constraint_expression != "":
+                field_constraint_expression = self.convert_expression(
+                    field_constraint_expression, dot_field_name=field_name
                 )
-                if field_constraint_expression != "":
-                    field_constraint_expression = self.convert_expression(
-                        field_constraint_expression, dot_field_name=field_name
-                    )
-
-                    field_constraint_message = (
-                        str(
-                            feature.attribute(self.survey_constraint_message_index)
-                        ).strip()
-                        if self.survey_constraint_message_index >= 0
-                        and feature.attribute(self.survey_constraint_message_index)
-                        else ""
-                    )
 
-                    # setup constraints
-                    field_constraints.setConstraintExpression(
-                        field_constraint_expression, field_constraint_message
-                    )
-                    field_constraints.setConstraintStrength(
-                        QgsFieldConstraints.Constraint.ConstraintExpression,
-                        QgsFieldConstraints.ConstraintStrength.ConstraintStrengthHard,
-                    )
+                field_constraint_message = row_value(
+                    row, self.survey_constraint_message_index
+                )
 
-            if self.survey_required_index >= 0:
-                field_required = (
-                    str(feature.attribute(self.survey_required_index)).strip().lower()
-                    if feature.attribute(self.survey_required_index)
-                    else ""
+                # setup constraints
+                field_constraints.setConstraintExpression(
+                    field_constraint_expression, field_constraint_message
+                )
+                field_constraints.setConstraintStrength(
+                    QgsFieldConstraints.Constraint.ConstraintExpression,
+                    QgsFieldConstraints.ConstraintStrength.ConstraintStrengthHard,
                 )
 
-                if field_required == "yes":
-                    field_constraints.setConstraint(
-                        QgsFieldConstraints.Constraint.ConstraintNotNull,
-                        QgsFieldConstraints.ConstraintOrigin.ConstraintOriginLayer,
-                    )
-                    field_constraints.setConstraintStrength(
-                        QgsFieldConstraints.Constraint.ConstraintNotNull,
-                        QgsFieldConstraints.ConstraintStrength.ConstraintStrengthHard,
-                    )
+            if field_required == "yes":
+                field_constraints.setConstraint(
+                    QgsFieldConstraints.Constraint.ConstraintNotNull,
+                    QgsFieldConstraints.ConstraintOrigin.ConstraintOriginLayer,
+                )
+                field_constraints.setConstraintStrength(
+                    QgsFieldConstraints.Constraint.ConstraintNotNull,
+                    QgsFieldConstraints.ConstraintStrength.ConstraintStrengthHard,
+                )
 
             field.setConstraints(field_constraints)
 
@@ -447,13 +682,12 @@ class XLSFormConverter(QObject):
         else:
             self.info.emit(self.tr("Creating main survey layer"))
 
-        layer_geometry = self.detect_geometry(name)
-        layer_fields = self.detect_fields(name)
+        layer_geometry, layer_fields = self.detect_layer_spec(name)
 
         writer_options = QgsVectorFileWriter.SaveVectorOptions()
         writer_options.actionOnExistingFile = (
             QgsVectorFileWriter.ActionOnExistingFile.CreateOrOverwriteLayer
-            if os.path.isfile(self.output_file)
+            if self.output_file_exists
             else QgsVectorFileWriter.ActionOnExistingFile.CreateOrOverwriteFile
         )
         writer_options.layerName = "survey" if not name else name
@@ -463,7 +697,7 @@ class XLSFormConverter(QObject):
 
         assert project
 
-        QgsVectorFileWriter.create(
+        writer = QgsVectorFileWriter.create(
             self.output_file,
             layer_fields,
             layer_geometry,
@@ -473,6 +707,12 @@ class XLSFormConverter(QObject):
             project.transformContext(),
             writer_options,
         )
+        if (
+            writer is not None
+            and writer.hasError() == QgsVectorFileWriter.WriterError.NoError
+        ):
+            self.output_file_exists = True
+        del writer
 
         layer = QgsVectorLayer(
             self.output_file + "|layername=" + writer_options.layerName,
@@ -485,20 +725,30 @@ class XLSFormConverter(QObject):
             layer.fields().indexOf("uuid"), QgsDefaultValue("uuid()", False)
         )
 
+        # Every constraint setter refreshes the layer fields, only call them for
+        # fields that actually carry a constraint
+        output_fields = layer.fields()
         for layer_field in layer_fields:
-            field_index = layer.fields().indexOf(layer_field.name())
-            if field_index >= 0:
-                layer.setConstraintExpression(
-                    field_index,
-                    layer_field.constraints().constraintExpression(),
-                    layer_field.constraints().constraintDescription(),
+            field_constraints = layer_field.constraints()
+            constraint_expression = field_constraints.constraintExpression()
+            not_null = (
+                field_constraints.constraintStrength(
+                    QgsFieldConstraints.Constraint.ConstraintNotNull
                 )
-                if (
-                    layer_field.constraints().constraintStrength(
-                        QgsFieldConstraints.Constraint.ConstraintNotNull
+                == QgsFieldConstraints.ConstraintStrength.ConstraintStrengthHard
+            )
+            if not constraint_expression and not not_null:
+                continue
+
+            field_index = output_fields.indexOf(layer_field.name())
+            if field_index >= 0:
+                if constraint_expression:
+                    layer.setConstraintExpression(
+                        field_index,
+                        constraint_expression,
+                        field_constraints.constraintDescription(),
                     )
-                    == QgsFieldConstraints.ConstraintStrength.ConstraintStrengthHard
-                ):
+                if not_null:
                     layer.setFieldConstraint(
                         field_index,
                         QgsFieldConstraints.Constraint.ConstraintNotNull,
@@ -512,30 +762,42 @@ class XLSFormConverter(QObject):
 
         return layer
 
-    def create_editor_widget(self, feature):
-        type_details = str(feature.attribute(self.survey_type_index)).split(" ")
-        type_details[0] = type_details[0].lower()
+    def create_form_frame(self, layer):
+        """
+        Clears the drag and drop form of a newly created layer and adds the
+        "Survey" tab that holds its questions.
+        """
+        form = layer.editFormConfig()
+        invisible_root = form.invisibleRootContainer()
+
+        assert invisible_root is not None
+
+        invisible_root.clear()
+        form.setLayout(Qgis.AttributeFormLayout.DragAndDrop)
+
+        container = QgsAttributeEditorContainer("Survey", invisible_root)
+        container.setType(Qgis.AttributeEditorContainerType.Tab)
+        invisible_root.addChildElement(container)
+
+        return FormFrame(layer, form, [container])
+
+    def create_editor_widget(self, index):
+        row = self.survey_rows[index]
+        type_details = self.survey_type_details[index]
 
         editor_widget = None
 
         if type_details[0] == "integer" or type_details[0] == "decimal":
-            editor_widget = QgsEditorWidgetSetup("Range", {})
-            editor_widget = QgsEditorWidgetSetup("Range", {})
+            editor_widget = default_editor_widget("Range")
         elif type_details[0] == "range":
             if self.survey_parameters_index >= 0:
-                parameters = str(feature.attribute(self.survey_parameters_index))
+                parameters = row_value(row, self.survey_parameters_index)
 
-                start_value = re.search(
-                    r"start=\s*([0-9]+)", parameters, flags=re.IGNORECASE
-                )
+                start_value = self.RANGE_START_RE.search(parameters)
                 start_value = start_value.group(1) if start_value else 0
-                end_value = re.search(
-                    r"end=\s*([0-9]+)", parameters, flags=re.IGNORECASE
-                )
+                end_value = self.RANGE_END_RE.search(parameters)
                 end_value = end_value.group(1) if end_value else 10
-                step_value = re.search(
-                    r"step=\s*([0-9]+)", parameters, flags=re.IGNORECASE
-                )
+                step_value = self.RANGE_STEP_RE.search(parameters)
                 step_value = step_value.group(1) if step_value else 1
 
                 editor_widget = QgsEditorWidgetSetup(
@@ -548,17 +810,9 @@ class XLSFormConverter(QObject):
                     },
                 )
             else:
-                editor_widget = QgsEditorWidgetSetup("Range", {})
-        elif (
-            type_details[0] == "date"
-            or type_details[0] == "time"
-            or type_details[0] == "datetime"
-        ):
-            field_format = "yyyy-MM-dd"
-            if type_details[0] == "time":
-                field_format = "HH:mm:ss"
-            elif type_details[0] == "datetime":
-                field_format = "yyyy-MM-dd HH:mm:ss"
+                editor_widget = default_editor_widget("Range")
+        elif type_details[0] in self.DATETIME_FORMATS:
+            field_format = self.DATETIME_FORMATS[type_details[0]]
             editor_widget = QgsEditorWidgetSetup(
                 "DateTime",
                 {
@@ -569,37 +823,24 @@ class XLSFormConverter(QObject):
                     "calendar_popup": True,
                 },
             )
-        elif (
-            type_details[0] == "image"
-            or type_details[0] == "audio"
-            or type_details[0] == "background-audio"
-            or type_details[0] == "video"
-            or type_details[0] == "file"
-        ):
-            document_viewer = 0
-            if type_details[0] == "image":
-                document_viewer = 1
-            elif type_details[0] == "audio" or type_details[0] == "background-audio":
-                document_viewer = 3
-            elif type_details[0] == "video":
-                document_viewer = 4
+        elif type_details[0] in self.DOCUMENT_VIEWERS:
             editor_widget = QgsEditorWidgetSetup(
                 "ExternalResource",
                 {
-                    "DocumentViewer": document_viewer,
+                    "DocumentViewer": self.DOCUMENT_VIEWERS[type_details[0]],
                     "FileWidget": True,
                     "FileWidgetButton": True,
                     "RelativeStorage": 1,
                 },
             )
         elif type_details[0] == "acknowledge":
-            editor_widget = QgsEditorWidgetSetup("CheckBox", {})
+            editor_widget = default_editor_widget("CheckBox")
         elif (
             type_details[0] == "text"
             or type_details[0] == "barcode"
             or type_details[0] == "calculate"
         ):
-            editor_widget = QgsEditorWidgetSetup("TextEdit", {})
+            editor_widget = default_editor_widget("TextEdit")
         elif (
             type_details[0] == "select_one"
             or type_details[0] == "select_multiple"
@@ -617,31 +858,24 @@ class XLSFormConverter(QObject):
                 if len(type_details) >= 2:
                     list_name = "list_" + " ".join(type_details[1:])
                     if self.survey_parameters_index >= 0:
-                        parameters = str(
-                            feature.attribute(self.survey_parameters_index)
-                        )
-                        match = re.search(r"(?:value)\s*=\s*([^\s]*)", parameters)
+                        parameters = row_value(row, self.survey_parameters_index)
+                        match = self.PARAMETER_VALUE_RE.search(parameters)
                         if match:
                             list_key = match.group(1)
-                        match = re.search(r"(?:label)\s*=\s*([^\s]*)", parameters)
+                        match = self.PARAMETER_LABEL_RE.search(parameters)
                         if match:
                             list_value = match.group(1)
             else:
                 list_name = "list_" + type_details[1]
 
             if list_name:
-                value_layer = self.output_project.mapLayersByName(list_name)
-                if value_layer:
+                value_layer = self.list_layers.get(list_name)
+                if value_layer is not None:
                     allow_multi = (
                         type_details[0] == "select_multiple"
                         or type_details[0] == "select_multiple_from_file"
                     )
-                    filter_expression = (
-                        str(feature.attribute(self.survey_choice_filter_index)).strip()
-                        if self.survey_choice_filter_index >= 0
-                        and feature.attribute(self.survey_choice_filter_index)
-                        else ""
-                    )
+                    filter_expression = row_value(row, self.survey_choice_filter_index)
                     if filter_expression != "":
                         filter_expression = self.convert_expression(
                             filter_expression, use_current_value=True
@@ -660,89 +894,65 @@ class XLSFormConverter(QObject):
                             )
                         else:
                             filter_expression = '"' + list_key + "\" != ''"
-                    editor_widget = QgsEditorWidgetSetup(
-                        "ValueRelation",
-                        {
-                            "Layer": value_layer[0].id(),
-                            "LayerName": type_details[1],
-                            "LayerProviderName": "ogr",
-                            "LayerSource": value_layer[0].source(),
-                            "Key": list_key,
-                            "Value": list_value,
-                            "AllowNull": False,
-                            "AllowMulti": allow_multi,
-                            "FilterExpression": filter_expression,
-                        },
+
+                    # Many questions share the same list (e.g. yes/no), reuse their setup
+                    widget_key = (
+                        list_name,
+                        type_details[1],
+                        list_key,
+                        list_value,
+                        allow_multi,
+                        filter_expression,
                     )
+                    editor_widget = self.value_relation_widgets.get(widget_key)
+                    if editor_widget is None:
+                        editor_widget = QgsEditorWidgetSetup(
+                            "ValueRelation",
+                            {
+                                "Layer": value_layer.id(),
+                                "LayerName": type_details[1],
+                                "LayerProviderName": "ogr",
+                                "LayerSource": value_layer.source(),
+                                "Key": list_key,
+                                "Value": list_value,
+                                "AllowNull": False,
+                                "AllowMulti": allow_multi,
+                                "FilterExpression": filter_expression,
+                            },
+                        )
+                        self.value_relation_widgets[widget_key] = editor_widget
                 else:
-                    editor_widget = QgsEditorWidgetSetup("TextEdit", {})
+                    editor_widget = default_editor_widget("TextEdit")
             else:
-                editor_widget = QgsEditorWidgetSetup("TextEdit", {})
+                editor_widget = default_editor_widget("TextEdit")
         elif (
-            type_details[0] == "today"
-            or type_details[0] == "start"
-            or type_details[0] == "end"
-            or type_details[0] == "username"
-            or type_details[0] == "email"
+            type_details[0] in self.AUTOMATIC_METADATA_TYPES
             or type_details[0] == "hidden"
         ):
             # Metadata values are hidden
-            editor_widget = QgsEditorWidgetSetup("Hidden", {})
+            editor_widget = default_editor_widget("Hidden")
 
         if editor_widget and self.survey_calculation_index >= 0:
-            calculation = (
-                str(feature.attribute(self.survey_calculation_index)).strip()
-                if feature.attribute(self.survey_calculation_index)
-                else ""
-            )
-            field_alias = (
-                str(feature.attribute(self.survey_label_index)).strip()
-                if feature.attribute(self.survey_label_index)
-                else ""
-            )
+            calculation = row_value(row, self.survey_calculation_index)
+            field_alias = row_value(row, self.survey_label_index)
             if calculation != "" and field_alias == "":
-                editor_widget = QgsEditorWidgetSetup("Hidden", {})
+                editor_widget = default_editor_widget("Hidden")
 
         return editor_widget
 
-    def detect_geometry(self, child_name=None):
-        assert self.survey_layer is not None
+    def detect_layer_spec(self, child_name=None):
+        """
+        Detects the geometry type and the fields of the survey layer (or of the
+        child_name repeat layer) from the survey rows binned for that layer.
 
-        geometry = Qgis.WkbType.NoGeometry
+        The result is cached per child name for the duration of a conversion.
+        """
+        if child_name in self.layer_specs:
+            return self.layer_specs[child_name]
 
-        current_child_name = []
-        it = self.survey_layer.getFeatures()
-        if self.survey_skip_first:
-            feature = QgsFeature()
-            it.nextFeature(feature)
-
-        for feature in it:  # type: ignore
-            feature_type = str(feature.attribute(self.survey_type_index)).strip()
-            if feature_type == "begin repeat":
-                current_child_name.append(feature.attribute(self.survey_name_index))
-            elif feature_type == "end repeat":
-                current_child_name.pop()
-            else:
-                if (
-                    len(current_child_name) > 0 and current_child_name[-1] == child_name
-                ) or (len(current_child_name) == 0 and not child_name):
-                    type_details = str(feature.attribute(self.survey_type_index)).split(
-                        " "
-                    )[0]
-                    if type_details == "geopoint" or type_details == "start-geopoint":
-                        geometry = Qgis.WkbType.MultiPoint
-                        break
-                    if type_details == "geotrace" or type_details == "start-geotrace":
-                        geometry = Qgis.WkbType.MultiLineString
-                        break
-                    if type_details == "geoshape" or type_details == "start-geoshape":
-                        geometry = Qgis.WkbType.MultiPolygon
-                        break
-
-        return geometry
-
-    def detect_fields(self, child_name=None):
-        assert self.survey_layer is not None
+        geometry = self.survey_child_geometries.get(
+            child_name or None, Qgis.WkbType.NoGeometry
+        )
 
         fields = QgsFields()
 
@@ -750,81 +960,60 @@ class XLSFormConverter(QObject):
         if child_name:
             fields.append(QgsField("uuid_parent", QMetaType.Type.QString))
 
-        current_child_name = []
-        it = self.survey_layer.getFeatures()
-        if self.survey_skip_first:
-            feature = QgsFeature()
-            it.nextFeature(feature)
-
-        for feature in it:  # type: ignore
-            feature_type = str(feature.attribute(self.survey_type_index)).strip()
-            feature_name = str(feature.attribute(self.survey_name_index)).strip()
-            if feature_type == "begin repeat" or feature_type == "begin_repeat":
-                current_child_name.append(feature_name)
-            elif feature_type == "end repeat" or feature_type == "end_repeat":
-                current_child_name.pop()
-            else:
-                if (
-                    len(current_child_name) > 0 and current_child_name[-1] == child_name
-                ) or (len(current_child_name) == 0 and not child_name):
-                    field = self.create_field(feature)
-                    if field:
-                        fields.append(field)
-                    else:
-                        type_details = str(
-                            feature.attribute(self.survey_type_index)
-                        ).split(" ")
-                        type_details[0] = type_details[0].lower()
-                        if type_details[0] in self.FIELD_TYPES:
-                            self.warning.emit(
-                                self.tr(
-                                    "Unsupported field type {} for layer {}, skipping".format(
-                                        type_details[0],
-                                        "survey" if not child_name else child_name,
-                                    )
-                                )
+        for index in self.survey_child_rows.get(child_name or None, []):
+            feature_type = self.survey_types[index]
+            type_details = self.survey_type_details[index]
+
+            field = self.create_field(index)
+            if field:
+                fields.append(field)
+            elif type_details[0] in self.FIELD_TYPES:
+                self.warning.emit(
+                    self.tr(
+                        "Unsupported field type {} for layer {}, skipping".format(
+                            type_details[0],
+                            "survey" if not child_name else child_name,
+                        )
+                    )
+                )
+            elif type_details[0] in self.METADATA_TYPES:
+                if not type_details[0] == "end" or feature_type == "end":
+                    self.warning.emit(
+                        self.tr(
+                            "Unsupported metadata {} for layer {}, skipping".format(
+                                type_details[0],
+                                "survey" if not child_name else child_name,
                             )
-                        elif type_details[0] in self.METADATA_TYPES:
-                            if (
-                                not type_details[0] == "end"
-                                or feature.attribute(self.survey_type_index)
-                                .strip()
-                                .lower()
-                                == "end"
-                            ):
-                                self.warning.emit(
-                                    self.tr(
-                                        "Unsupported metadata {} for layer {}, skipping".format(
-                                            type_details[0],
-                                            "survey" if not child_name else child_name,
-                                        )
-                                    )
-                                )
+                        )
+                    )
 
-        return fields
+        self.layer_specs[child_name] = (geometry, fields)
 
-    def convert_label_expression(self, original_label_expression):
-        label_expression = original_label_expression
+        return self.layer_specs[child_name]
 
-        # ${field} to "field"
-        label_expression = label_expression.replace("'", "\\'")
-        label_expression = re.sub(
-            r"\$\{([^}]+)}", "' || \"\\1\" || '", label_expression
+    def convert_label_expression(self, original_label_expression):
+        # ${field} to "field" and ' to \' in a single pass
+        label_expression = "'{}'".format(
+            self.LABEL_TOKEN_RE.sub(
+                lambda match: (
+                    "' || \"{}\" || '".format(match.group(1))
+                    if match.group(1) is not None
+                    else "\\'"
+                ),
+                original_label_expression,
+            )
         )
-        label_expression = "'{}'".format(label_expression)
 
-        label_expression_try = QgsExpression(label_expression)
-        if label_expression_try.hasParserError():
-            self.warning.emit(
-                self.tr(
-                    "Unsupported label expression {}".format(original_label_expression)
-                )
-            )
+        self.check_expression(
+            label_expression,
+            "Unsupported label expression {}",
+            original_label_expression,
+        )
 
         return label_expression
 
     def convert_choices(
-        self, list_name, features, output_lists_field_names, output_lists_fields
+        self, list_name, rows, output_lists_field_names, output_lists_fields
     ):
         project = QgsProject.instance()
 
@@ -833,7 +1022,7 @@ class XLSFormConverter(QObject):
         writer_options = QgsVectorFileWriter.SaveVectorOptions()
         writer_options.actionOnExistingFile = (
             QgsVectorFileWriter.ActionOnExistingFile.CreateOrOverwriteLayer
-            if os.path.isfile(self.output_file)
+            if self.output_file_exists
             else QgsVectorFileWriter.ActionOnExistingFile.CreateOrOverwriteFile
         )
         writer_options.layerName = "list_" + list_name
@@ -849,22 +1038,48 @@ class XLSFormConverter(QObject):
 
         assert output_lists_sink
 
+        self.output_file_exists = True
+
         # Add pseudo-NULL value
         output_feature = QgsFeature(output_lists_fields)
         output_feature.setAttribute("name", "")
         output_feature.setAttribute(self.label_field_name, "")
-        output_lists_sink.addFeature(output_feature)
+        output_features = [output_feature]
+
+        # Pair each output field with the first sheet column of the same name
+        columns = []
+        label_column = -1
+        seen_field_names = set()
+        for column, field_name in enumerate(output_lists_field_names):
+            if field_name in seen_field_names:
+                continue
+            seen_field_names.add(field_name)
 
-        for feature in features:
+            field_index = output_lists_fields.indexOf(field_name)
+            if field_index >= 0:
+                columns.append((field_index, column))
+            if field_name == self.label_field_name:
+                label_column = column
+
+        for row in rows:
             output_feature = QgsFeature(output_lists_fields)
-            for field_name in output_lists_field_names:
-                attribute_value = feature.attribute(
-                    output_lists_field_names.index(field_name)
-                )
-                if field_name == self.label_field_name:
+            for field_index, column in columns:
+                attribute_value = row[column]
+                if column == label_column:
                     attribute_value = strip_tags(str(attribute_value))
-                output_feature.setAttribute(field_name, attribute_value)
-            output_lists_sink.addFeature(output_feature)
+                output_feature.setAttribute(field_index, attribute_value)
+            output_features.append(output_feature)
+
+            if len(output_features) >= self.CHOICES_WRITE_BATCH_SIZE:
+                output_lists_sink.addFeatures(
+                    output_features, QgsFeatureSink.Flag.FastInsert
+                )
+                output_features = []
+
+        if output_features:
+            output_lists_sink.addFeatures(
+                output_features, QgsFeatureSink.Flag.FastInsert
+            )
 
         output_lists_sink.flushBuffer()
         del output_lists_sink
@@ -877,6 +1092,7 @@ class XLSFormConverter(QObject):
         output_lists_layer.setCustomProperty("QFieldSync/cloud_action", "no_action")
         output_lists_layer.setCustomProperty("QFieldSync/action", "copy")
         self.output_project.addMapLayer(output_lists_layer)
+        self.list_layers[output_lists_layer.name()] = output_lists_layer
 
     def convert_external_choices(self, type_details):
         if len(type_details) < 2:
@@ -887,7 +1103,7 @@ class XLSFormConverter(QObject):
         if not from_file_path.exists():
             return False
 
-        if self.output_project.mapLayersByName("list_" + from_file):
+        if "list_" + from_file in self.list_layers:
             return True
 
         output_from_file_path = Path(self.output_directory).joinpath(from_file)
@@ -907,6 +1123,7 @@ class XLSFormConverter(QObject):
         output_from_layer.setCustomProperty("QFieldSync/cloud_action", "no_action")
         output_from_layer.setCustomProperty("QFieldSync/action", "copy")
         self.output_project.addMapLayer(output_from_layer)
+        self.list_layers[output_from_layer.name()] = output_from_layer
         return True
 
     def convert_expression(
@@ -916,113 +1133,140 @@ class XLSFormConverter(QObject):
         use_insert=False,
         dot_field_name=None,
     ):
-        expression = original_expression
+        cache_key = (original_expression, use_current_value, use_insert, dot_field_name)
+        if cache_key in self.expression_cache:
+            expression = self.expression_cache[cache_key]
+            if not use_insert:
+                self.check_expression(
+                    expression, "Unsupported expression {}", original_expression
+                )
+            return expression
 
         # be tolerant of ‘’ by replacing them with ''
-        expression = expression.replace("‘", "'")
-        expression = expression.replace("’", "'")
+        expression = original_expression.translate(self.QUOTES_TRANSLATION)
 
         # replace dot with field name
         if dot_field_name:
-            expression = re.sub(
-                r"(^|[\s<>=\(\)\,])\.($|[\s<>=\(\)\,])",
+            expression = self.DOT_REFERENCE_RE.sub(
                 r"\1${" + dot_field_name + r"}\2",
                 expression,
             )
 
         # selected(${field}, value) to ${field} = value
-        expression = re.sub(
-            r"selected\s*\(\s*(\$\{[^}]+})\,([^)]+)\)", r"\1 = \2", expression
-        )
+        if "selected" in expression:
+            expression = self.SELECTED_RE.sub(r"\1 = \2", expression)
 
         # regexp(${field}, value) to regexp_match(${field}, value)
-        match = re.search(
-            r"regex\s*\(\s*(\$\{[^}]+})\s*\,\s*'(.+)'\s*\)\s*$", expression
-        )
-        if match:
-            # warning: ugly hack ahead
-            expression = re.sub(
-                r"regex\s*\(\s*(\$\{[^}]+})\s*\,\s*'(.+)'\s*\)\s*$",
-                "regexp_match(\\1, '",
-                expression,
-            )
-            expression = "{}{}')".format(
-                expression, format(match.group(2).replace("\\", "\\\\"))
-            )
-
-            expression = re.sub(
-                r"([^\[])\[:(digit|upper|lower|alpha|alnum|punct|blank|word):\]([^\]])",
-                r"\1[[:\2:]]\3",
+        if "regex" in expression:
+            expression = self.REGEX_CALL_RE.sub(
+                lambda match: self.POSIX_CLASS_RE.sub(
+                    r"\1[[:\2:]]\3",
+                    "regexp_match({}, '{}')".format(
+                        match.group(1), match.group(2).replace("\\", "\\\\")
+                    ),
+                ),
                 expression,
             )
 
-        if use_insert:
-            if use_current_value:
-                # ${field} = value to current_value('field')
-                for (
-                    calculate_name,
-                    calculate_expression,
-                ) in self.calculate_expressions.items():
-                    expression = re.sub(
-                        r"\$\{" + calculate_name + r"}",
-                        r"[% "
-                        + self.convert_expression(
-                            calculate_expression, use_current_value=True
+        if "${" in expression:
+            if use_insert:
+                if self.calculate_expressions:
+                    # ${calculate} to [% calculation %]
+                    if self.calculate_names_re is None:
+                        calculate_names = sorted(
+                            self.calculate_expressions, key=len, reverse=True
                         )
-                        + r" %]",
-                        expression,
-                    )
-                expression = re.sub(
-                    r"\$\{([^}]+)}", r"[% current_value('\1') %]", expression
-                )
-            else:
-                # ${field} = value to "field"
-                for (
-                    calculate_name,
-                    calculate_expression,
-                ) in self.calculate_expressions.items():
-                    expression = re.sub(
-                        r"\$\{" + calculate_name + r"}",
-                        r"[% "
-                        + self.convert_expression(
-                            calculate_expression, use_current_value=False
+                        self.calculate_names_re = re.compile(
+                            r"\$\{(" + "|".join(map(re.escape, calculate_names)) + r")}"
                         )
-                        + r" %]",
+
+                    expression = self.calculate_names_re.sub(
+                        lambda match: (
+                            "[% "
+                            + self.convert_expression(
+                                self.calculate_expressions[match.group(1)],
+                                use_current_value=use_current_value,
+                            )
+                            + " %]"
+                        ),
                         expression,
                     )
-                expression = re.sub(r"\$\{([^}]+)}", r'[% "\1" %]', expression)
-        else:
-            if use_current_value:
-                # ${field} = value to current_value('field')
-                expression = re.sub(r"\$\{([^}]+)}", r"current_value('\1')", expression)
+
+                if use_current_value:
+                    # ${field} = value to current_value('field')
+                    expression = self.FIELD_REFERENCE_RE.sub(
+                        r"[% current_value('\1') %]", expression
+                    )
+                else:
+                    # ${field} = value to "field"
+                    expression = self.FIELD_REFERENCE_RE.sub(r'[% "\1" %]', expression)
             else:
-                # ${field} = value to "field"
-                expression = re.sub(r"\$\{([^}]+)}", r'"\1"', expression)
+                if use_current_value:
+                    # ${field} = value to current_value('field')
+                    expression = self.FIELD_REFERENCE_RE.sub(
+                        r"current_value('\1')", expression
+                    )
+                else:
+                    # ${field} = value to "field"
+                    expression = self.FIELD_REFERENCE_RE.sub(r'"\1"', expression)
 
         # today() to format_date(now()...)
-        expression = re.sub(
-            r"today\(\)", r"format_date(now(),'yyyy-MM-dd')", expression
-        )
+        if "today()" in expression:
+            expression = self.TODAY_RE.sub(
+                r"format_date(now(),'yyyy-MM-dd')", expression
+            )
 
         # string-length(...) to length(...)
-        expression = re.sub(
-            r"string-length\s*\(\s*([^\)]+)\)", r"length(\1)", expression
-        )
+        if "string-length" in expression:
+            expression = self.STRING_LENGTH_RE.sub(r"length(\1)", expression)
 
         # selected(1, 2) to 1 = 2
-        expression = re.sub(
-            r"selected\s*\(\s*(\$\{[^}]+})\,([^)]+)\)", r"\1 = \2", expression
-        )
+        if "selected" in expression:
+            expression = self.SELECTED_RE.sub(r"\1 = \2", expression)
 
         if not use_insert:
-            expression_try = QgsExpression(expression)
-            if expression_try.hasParserError():
-                self.warning.emit(
-                    self.tr("Unsupported expression {}".format(original_expression))
-                )
+            self.check_expression(
+                expression, "Unsupported expression {}", original_expression
+            )
 
+        self.expression_cache[cache_key] = expression
         return expression
 
+    def warn_once(self, message):
+        """
+        Emits a warning unless the same message was already emitted during the
+        current conversion.
+        """
+        if message in self.emitted_warnings:
+            return
+
+        self.emitted_warnings.add(message)
+        self.warning.emit(message)
+
+    def check_expression(self, expression, message, original_expression):
+        """
+        Warns when QGIS cannot parse a converted expression. During a conversion the
+        check is deferred to validate_pending_expressions() so that each distinct
+        expression is parsed once.
+        """
+        if self.defer_expression_validation:
+            if expression not in self.pending_expressions:
+                self.pending_expressions[expression] = (message, original_expression)
+        elif QgsExpression(expression).hasParserError():
+            self.warning.emit(self.tr(message.format(original_expression)))
+
+    def validate_pending_expressions(self):
+        """
+        Parses the expressions deferred during the conversion and warns about those
+        QGIS cannot parse.
+        """
+        for expression in self.pending_expressions:
+            if QgsExpression(expression).hasParserError():
+                message, original_expression = self.pending_expressions[expression]
+                self.warning.emit(self.tr(message.format(original_expression)))
+
+        self.pending_expressions = {}
+
     def process_project_write(self, document):
         nl = document.elementsByTagName("qgis")
         if nl.count() == 0:
@@ -1041,6 +1285,23 @@ class XLSFormConverter(QObject):
             ms.setExtent(self.output_extent)
         ms.writeXml(mapcanvasNode, document)
 
+    def persist_project(self, output_directory, settings_filename):
+        """
+        Writes the output project into the output directory and returns its path.
+        The map canvas settings hook is connected only once per output project.
+        """
+        output_project_file = str(
+            os.path.join(output_directory, settings_filename + ".qgz")
+        )
+
+        if not self.output_project_write_connected:
+            self.output_project.writeProject.connect(self.process_project_write)
+            self.output_project_write_connected = True
+
+        self.output_project.write(output_project_file)
+
+        return output_project_file
+
     def set_custom_title(self, title: str) -> None:
         self.custom_title = title
 
@@ -1082,30 +1343,28 @@ class XLSFormConverter(QObject):
 
         # Project-wide image max-pixel parameter
         settings_max_pixels = 0
+        # Set once defined and undefined max-pixels were mixed, nothing can change after
+        settings_max_pixels_mixed = False
 
         assert self.settings_layer is not None
 
         if self.settings_layer.isValid():
-            it = self.settings_layer.getFeatures()
-            if self.settings_skip_first:
-                feature = QgsFeature()
-                it.nextFeature(feature)
-
-            for feature in it:  # type: ignore
-                if self.settings_form_title_index >= 0 and feature.attribute(
-                    self.settings_form_title_index
+            for row in self.settings_rows:
+                if (
+                    self.settings_form_title_index >= 0
+                    and row[self.settings_form_title_index]
                 ):
-                    settings_title = feature.attribute(self.settings_form_title_index)
-                if self.settings_form_id_index >= 0 and feature.attribute(
-                    self.settings_form_id_index
+                    settings_title = row[self.settings_form_title_index]
+                if (
+                    self.settings_form_id_index >= 0
+                    and row[self.settings_form_id_index]
                 ):
-                    settings_id = feature.attribute(self.settings_form_id_index)
-                if self.settings_default_language_index >= 0 and feature.attribute(
-                    self.settings_default_language_index
+                    settings_id = row[self.settings_form_id_index]
+                if (
+                    self.settings_default_language_index >= 0
+                    and row[self.settings_default_language_index]
                 ):
-                    settings_language = feature.attribute(
-                        self.settings_default_language_index
-                    )
+                    settings_language = row[self.settings_default_language_index]
                 break
 
         if self.custom_title:
@@ -1119,29 +1378,25 @@ class XLSFormConverter(QObject):
         else:
             self.label_field_name = "label"
 
-        fields = self.survey_layer.fields().names()
-        if fields[0] == "Field1":
-            fields = self.survey_layer.getFeature(1).attributes()
+        fields = self.survey_fields
+        fields_lower = [field.lower() for field in fields]
+        label_field_name_lower = self.label_field_name.lower()
 
         self.survey_label_index = -1
-        for index, field in enumerate(fields):
-            if field.lower() == self.label_field_name.lower():
-                self.label_field_name = field
-                self.survey_label_index = index
-                break
+        if label_field_name_lower in fields_lower:
+            self.survey_label_index = fields_lower.index(label_field_name_lower)
+            self.label_field_name = fields[self.survey_label_index]
 
         if self.survey_label_index == -1:
             fallback_label_field_name = ""
             fallback_survey_label_index = -1
-            for index, field in enumerate(fields):
-                if field.lower() == "label":
+            for index, field in enumerate(fields_lower):
+                if field == "label":
                     fallback_label_field_name = "label"
                     fallback_survey_label_index = index
                     break
-                elif not fallback_label_field_name and field.lower().startswith(
-                    "label::"
-                ):
-                    fallback_label_field_name = field
+                elif not fallback_label_field_name and field.startswith("label::"):
+                    fallback_label_field_name = fields[index]
                     fallback_survey_label_index = index
 
             if fallback_survey_label_index >= 0:
@@ -1177,15 +1432,12 @@ class XLSFormConverter(QObject):
         assert self.choices_layer is not None
 
         if self.choices_layer.isValid():
-            fields = self.choices_layer.fields().names()
-            if fields[0] == "Field1":
-                fields = self.choices_layer.getFeature(1).attributes()
+            fields_lower = [field.lower() for field in self.choices_fields]
+            label_field_name_lower = self.label_field_name.lower()
 
             self.choices_label_index = -1
-            for index, field in enumerate(fields):
-                if field.lower() == self.label_field_name.lower():
-                    self.choices_label_index = index
-                    break
+            if label_field_name_lower in fields_lower:
+                self.choices_label_index = fields_lower.index(label_field_name_lower)
 
             if self.choices_label_index == -1:
                 self.error.emit(
@@ -1203,8 +1455,8 @@ class XLSFormConverter(QObject):
             .encode("ascii", "ignore")
             .decode("ascii")
         )
-        settings_filename = re.sub(r"[^\w\s-]", "", settings_filename)
-        settings_filename = re.sub(r"[-\s]+", "-", settings_filename)
+        settings_filename = self.FILENAME_INVALID_RE.sub("", settings_filename)
+        settings_filename = self.FILENAME_SEPARATORS_RE.sub("-", settings_filename)
 
         self.info.emit(
             self.tr("Creating survey {} (id: {})".format(settings_title, settings_id))
@@ -1214,8 +1466,13 @@ class XLSFormConverter(QObject):
         self.output_file = str(
             os.path.join(output_directory, settings_filename + ".gpkg")
         )
+        self.output_file_exists = os.path.isfile(self.output_file)
         self.output_project = QgsProject()
         self.output_project.setCrs(self.crs)
+        self.output_project_write_connected = False
+
+        self.list_layers = {}
+        self.value_relation_widgets = {}
 
         if self.basemap in self.BASEMAPS:
             base_layer = QgsRasterLayer(
@@ -1227,124 +1484,71 @@ class XLSFormConverter(QObject):
 
         # Choices handling
         output_lists_fields = QgsFields()
-        output_lists_field_names = self.choices_layer.fields().names()
-        if self.choices_skip_first:
-            output_lists_field_names = self.choices_layer.getFeature(1).attributes()
+        output_lists_field_names = self.choices_fields
 
         for field_name in output_lists_field_names:
             output_lists_fields.append(QgsField(field_name, QMetaType.Type.QString))
 
-        lists = {}
+        for list_name, rows in self.choices_lists.items():
+            self.convert_choices(
+                list_name, rows, output_lists_field_names, output_lists_fields
+            )
 
-        it = self.choices_layer.getFeatures()
-        if self.choices_skip_first:
-            feature = QgsFeature()
-            it.nextFeature(feature)
+        # Survey handling
+        self.calculate_expressions = {}
+        self.calculate_names_re = None
+        self.expression_cache = {}
+        self.pending_expressions = {}
+        self.defer_expression_validation = True
+        self.layer_specs = {}
+        self.emitted_warnings = set()
 
-        for feature in it:  # type: ignore
-            list_name = feature.attribute(self.choices_list_name_index)
-            if not list_name:
-                continue
+        survey_frame = self.create_form_frame(self.create_layer())
+        frames = [survey_frame]
 
-            list_name = str(list_name)
-            if list_name not in lists:
-                lists[list_name] = []
-            lists[list_name].append(feature)
+        relation_context = QgsRelationContext(self.output_project)
+        relation_manager = self.output_project.relationManager()
 
-        for list_name, features in lists.items():
-            self.convert_choices(
-                list_name, features, output_lists_field_names, output_lists_fields
-            )
+        assert relation_manager is not None
 
-        # External choices handling
-        it = self.survey_layer.getFeatures()
-        if self.survey_skip_first:
-            feature = QgsFeature()
-            it.nextFeature(feature)
+        # Optional columns are fixed for the whole sheet
+        has_read_only = self.survey_read_only_index >= 0
+        has_parameters = self.survey_parameters_index >= 0
 
-        for feature in it:  # type: ignore
-            feature_type = (
-                str(feature.attribute(self.survey_type_index)).strip().lower()
-            )
-            type_details = feature_type.split(" ")
+        for index, row in enumerate(self.survey_rows):
+            feature_type = self.survey_types[index]
+            if not feature_type:
+                continue
+
+            feature_name = self.survey_names[index]
+
+            # External choices handling, ahead of the editor widget setup
+            type_details = self.survey_type_details[index]
             if (
                 type_details[0] == "select_multiple_from_file"
-                or type_details[0] == "select_single_from_file"
+                or type_details[0] == "select_one_from_file"
             ):
                 if not self.convert_external_choices(type_details):
                     self.warning.emit(
                         self.tr(
                             "Select from file could not be converted, {} turned into text field".format(
-                                feature.attribute(self.survey_name_index)
+                                feature_name
                             )
                         )
                     )
 
-        # Survey handling
-        self.calculate_expressions = {}
-
-        current_layer = [self.create_layer()]
-        self.output_project.addMapLayer(current_layer[-1])
-
-        current_editor_form = [current_layer[-1].editFormConfig()]
-        invisible_root = current_editor_form[-1].invisibleRootContainer()
-
-        assert invisible_root is not None
-
-        invisible_root.clear()
-
-        current_editor_form[-1].setLayout(Qgis.AttributeFormLayout.DragAndDrop)
-
-        current_editor_group_level = [0]
-
-        current_container = [
-            QgsAttributeEditorContainer(
-                "Survey", current_editor_form[-1].invisibleRootContainer()
-            )
-        ]
-        current_container[-1].setType(Qgis.AttributeEditorContainerType.Tab)
-
-        invisible_root = current_editor_form[-1].invisibleRootContainer()
-
-        assert invisible_root is not None
-
-        invisible_root.addChildElement(current_container[-1])
-
-        relation_context = QgsRelationContext(self.output_project)
-
-        it = self.survey_layer.getFeatures()
-        if self.survey_skip_first:
-            feature = QgsFeature()
-            it.nextFeature(feature)
-
-        for feature in it:  # type: ignore
-            if not feature.attribute(self.survey_type_index):
-                continue
-
-            feature_type = (
-                str(feature.attribute(self.survey_type_index)).strip().lower()
-            )
-            feature_name = str(feature.attribute(self.survey_name_index)).strip()
-            feature_label = (
-                str(feature.attribute(self.survey_label_index)).strip()
-                if feature.attribute(self.survey_label_index)
-                else ""
-            )
+            feature_label = row_value(row, self.survey_label_index)
 
-            field_index = current_layer[-1].fields().indexOf(feature_name)
+            frame = frames[-1]
+            field_index = frame.layer.fields().indexOf(feature_name)
 
             relevant_container = None
-            relevant_expression = (
-                str(feature.attribute(self.survey_relevant_index)).strip()
-                if self.survey_relevant_index >= 0
-                and feature.attribute(self.survey_relevant_index)
-                else ""
-            )
+            relevant_expression = row_value(row, self.survey_relevant_index)
             if relevant_expression != "":
                 relevant_expression = self.convert_expression(relevant_expression)
-                if field_index >= 0 or feature_type == "begin repeat":
+                if field_index >= 0 or feature_type in self.BEGIN_REPEAT_TYPES:
                     relevant_container = QgsAttributeEditorContainer(
-                        feature_name + " - relevant", current_container[-1]
+                        feature_name + " - relevant", frame.containers[-1]
                     )
                     relevant_container.setShowLabel(False)
                     relevant_container.setType(
@@ -1354,115 +1558,85 @@ class XLSFormConverter(QObject):
                         QgsOptionalExpression(QgsExpression(relevant_expression))
                     )
 
-            if feature_type == "begin repeat" or feature_type == "begin_repeat":
-                current_layer.append(self.create_layer(feature_name))
-                self.output_project.addMapLayer(current_layer[-1])
-
-                current_editor_form.append(current_layer[-1].editFormConfig())
-                invisible_root = current_editor_form[-1].invisibleRootContainer()
-
-                assert invisible_root is not None
-
-                invisible_root.clear()
-                current_editor_form[-1].setLayout(Qgis.AttributeFormLayout.DragAndDrop)
-
-                current_editor_group_level.append(0)
-
-                current_container.append(
-                    QgsAttributeEditorContainer(
-                        "Survey", current_editor_form[-1].invisibleRootContainer()
-                    )
-                )
-                current_container[-1].setType(Qgis.AttributeEditorContainerType.Tab)
-                invisible_root = current_editor_form[-1].invisibleRootContainer()
-
-                assert invisible_root is not None
-
-                invisible_root.addChildElement(current_container[-1])
+            if feature_type in self.BEGIN_REPEAT_TYPES:
+                parent_frame = frame
+                frame = self.create_form_frame(self.create_layer(feature_name))
+                frames.append(frame)
 
                 relation = QgsRelation(relation_context)
                 relation.setName(feature_name)
-                relation.setReferencedLayer(current_layer[-2].id())
-                relation.setReferencingLayer(current_layer[-1].id())
+                relation.setReferencedLayer(parent_frame.layer.id())
+                relation.setReferencingLayer(frame.layer.id())
                 relation.addFieldPair("uuid_parent", "uuid")
                 relation.generateId()
 
-                relation_manager = self.output_project.relationManager()
-
-                assert relation_manager is not None
-
                 relation_manager.addRelation(relation)
 
                 editor_relation = QgsAttributeEditorRelation(
                     feature_name,
                     relation.id(),
-                    current_editor_form[-2].invisibleRootContainer(),
+                    parent_frame.form.invisibleRootContainer(),
                 )
                 feature_label = strip_tags(feature_label)
                 editor_relation.setLabel(feature_label)
                 editor_relation.setShowLabel(feature_label != "")
                 if relevant_container:
                     relevant_container.addChildElement(editor_relation)
-                    current_container[-2].addChildElement(relevant_container)
+                    parent_frame.containers[-1].addChildElement(relevant_container)
                 else:
-                    current_container[-2].addChildElement(editor_relation)
-            elif feature_type == "end repeat" or feature_type == "end_repeat":
-                if len(current_layer) > 1:
-                    current_container.pop()
-                    current_editor_group_level.pop()
-                    current_layer[-1].setEditFormConfig(current_editor_form[-1])
-                    current_layer.pop()
-                    current_editor_form.pop()
-            elif feature_type == "begin group" or feature_type == "begin_group":
+                    parent_frame.containers[-1].addChildElement(editor_relation)
+            elif feature_type in self.END_REPEAT_TYPES:
+                if len(frames) > 1:
+                    frame.layer.setEditFormConfig(frame.form)
+                    frames.pop()
+            elif feature_type in self.BEGIN_GROUP_TYPES:
                 feature_label = strip_tags(feature_label)
 
-                if self.groups_as_tabs and current_editor_group_level[-1] == 0:
-                    current_container.append(
+                if self.groups_as_tabs and frame.group_level == 0:
+                    frame.containers.append(
                         QgsAttributeEditorContainer(
                             feature_label,
-                            current_editor_form[-1].invisibleRootContainer(),
+                            frame.form.invisibleRootContainer(),
                         )
                     )
-                    current_container[-1].setType(Qgis.AttributeEditorContainerType.Tab)
+                    frame.containers[-1].setType(Qgis.AttributeEditorContainerType.Tab)
                     if relevant_expression != "":
-                        current_container[-1].setVisibilityExpression(
+                        frame.containers[-1].setVisibilityExpression(
                             QgsOptionalExpression(QgsExpression(relevant_expression))
                         )
-                    invisible_root = current_editor_form[-1].invisibleRootContainer()
+                    invisible_root = frame.form.invisibleRootContainer()
 
                     assert invisible_root is not None
 
-                    invisible_root.addChildElement(current_container[-1])
-                    current_editor_group_level[-1] = current_editor_group_level[-1] + 1
+                    invisible_root.addChildElement(frame.containers[-1])
+                    frame.group_level += 1
                 else:
-                    current_container.append(
-                        QgsAttributeEditorContainer(
-                            feature_label, current_container[-1]
-                        )
+                    frame.containers.append(
+                        QgsAttributeEditorContainer(feature_label, frame.containers[-1])
                     )
-                    current_container[-1].setType(
+                    frame.containers[-1].setType(
                         Qgis.AttributeEditorContainerType.GroupBox
                     )
-                    current_container[-1].setShowLabel(feature_label != "")
+                    frame.containers[-1].setShowLabel(feature_label != "")
                     if relevant_expression != "":
-                        current_container[-1].setVisibilityExpression(
+                        frame.containers[-1].setVisibilityExpression(
                             QgsOptionalExpression(QgsExpression(relevant_expression))
                         )
-                    current_container[-2].addChildElement(current_container[-1])
-                    current_editor_group_level[-1] = current_editor_group_level[-1] + 1
-            elif feature_type == "end group" or feature_type == "end_group":
-                if len(current_container) > 1:
-                    current_container.pop()
-                    current_editor_group_level[-1] = current_editor_group_level[-1] - 1
+                    frame.containers[-2].addChildElement(frame.containers[-1])
+                    frame.group_level += 1
+            elif feature_type in self.END_GROUP_TYPES:
+                if len(frame.containers) > 1:
+                    frame.containers.pop()
+                    frame.group_level -= 1
             elif feature_type == "note":
                 editor_text = QgsAttributeEditorTextElement(
-                    feature_name, current_container[-1]
+                    feature_name, frame.containers[-1]
                 )
 
-                if "markdown" in sys.modules:
-                    assert markdown  # type: ignore
-
-                    feature_label = markdown.markdown(feature_label)
+                if self.markdown is not None and self.MARKDOWN_SYNTAX_RE.search(
+                    feature_label
+                ):
+                    feature_label = self.markdown.markdown(feature_label)
 
                 editor_text.setText(
                     self.convert_expression(
@@ -1470,16 +1644,16 @@ class XLSFormConverter(QObject):
                     )
                 )
                 editor_text.setShowLabel(False)
-                current_container[-1].addChildElement(editor_text)
+                frame.containers[-1].addChildElement(editor_text)
             elif field_index >= 0:
                 editor_widget = None
                 editor_element = None
 
-                editor_widget = self.create_editor_widget(feature)
+                editor_widget = self.create_editor_widget(index)
                 if editor_widget:
-                    current_layer[-1].setEditorWidgetSetup(field_index, editor_widget)
+                    frame.layer.setEditorWidgetSetup(field_index, editor_widget)
                     editor_element = QgsAttributeEditorField(
-                        feature_name, field_index, current_container[-1]
+                        feature_name, field_index, frame.containers[-1]
                     )
 
                     if (
@@ -1495,32 +1669,24 @@ class XLSFormConverter(QObject):
                         props.setProperty(
                             QgsEditFormConfig.DataDefinedProperty.Alias, prop
                         )
-                        current_editor_form[-1].setDataDefinedFieldProperties(
-                            feature_name, props
-                        )
+                        frame.form.setDataDefinedFieldProperties(feature_name, props)
 
-                    if feature_type == "calculate" or feature_type == "hidden":
+                    if feature_type in self.CALCULATED_TYPES:
                         editor_element.setShowLabel(editor_widget.type() != "Hidden")
-                        current_editor_form[-1].setReadOnly(field_index, True)
-                    elif (
-                        feature_type == "today"
-                        or feature_type == "start"
-                        or feature_type == "end"
-                        or feature_type == "username"
-                        or feature_type == "email"
-                    ):
+                        frame.form.setReadOnly(field_index, True)
+                    elif feature_type in self.AUTOMATIC_METADATA_TYPES:
                         editor_element.setShowLabel(False)
-                        current_editor_form[-1].setReadOnly(field_index, True)
+                        frame.form.setReadOnly(field_index, True)
 
                         if feature_type == "today":
-                            current_layer[-1].setDefaultValueDefinition(
+                            frame.layer.setDefaultValueDefinition(
                                 field_index,
                                 QgsDefaultValue(
                                     "format_date(now(), 'yyyy-MM-dd')", False
                                 ),
                             )
                         elif feature_type == "start" or feature_type == "end":
-                            current_layer[-1].setDefaultValueDefinition(
+                            frame.layer.setDefaultValueDefinition(
                                 field_index,
                                 QgsDefaultValue(
                                     "format_date(now(), 'yyyy-MM-dd hh:mm:ss')",
@@ -1528,39 +1694,29 @@ class XLSFormConverter(QObject):
                                 ),
                             )
                         elif feature_type == "username":
-                            current_layer[-1].setDefaultValueDefinition(
+                            frame.layer.setDefaultValueDefinition(
                                 field_index, QgsDefaultValue("@cloud_username", False)
                             )
                         elif feature_type == "email":
-                            current_layer[-1].setDefaultValueDefinition(
+                            frame.layer.setDefaultValueDefinition(
                                 field_index, QgsDefaultValue("@cloud_useremail", False)
                             )
-                    elif self.survey_read_only_index >= 0:
-                        field_read_only = (
-                            str(feature.attribute(self.survey_read_only_index))
-                            .strip()
-                            .lower()
-                            if feature.attribute(self.survey_read_only_index)
-                            else ""
-                        )
-                        current_editor_form[-1].setReadOnly(
-                            field_index, field_read_only == "yes"
-                        )
+                    elif (
+                        has_read_only
+                        and row_value(row, self.survey_read_only_index).lower() == "yes"
+                    ):
+                        # fields are editable by default, only flag read-only ones
+                        frame.form.setReadOnly(field_index, True)
 
                     if relevant_container:
                         relevant_container.addChildElement(editor_element)
-                        current_container[-1].addChildElement(relevant_container)
+                        frame.containers[-1].addChildElement(relevant_container)
                     else:
-                        current_container[-1].addChildElement(editor_element)
+                        frame.containers[-1].addChildElement(editor_element)
 
-                    current_editor_form[-1].setLabelOnTop(field_index, True)
+                    frame.form.setLabelOnTop(field_index, True)
 
-                field_trigger = (
-                    str(feature.attribute(self.survey_trigger_index)).strip()
-                    if self.survey_trigger_index >= 0
-                    and feature.attribute(self.survey_trigger_index)
-                    else ""
-                )
+                field_trigger = row_value(row, self.survey_trigger_index)
                 if field_trigger != "":
                     self.warning.emit(
                         "Unsupported trigger option for {}, ignored".format(
@@ -1568,45 +1724,38 @@ class XLSFormConverter(QObject):
                         )
                     )
 
-                field_calculation = (
-                    str(feature.attribute(self.survey_calculation_index)).strip()
-                    if self.survey_calculation_index >= 0
-                    and feature.attribute(self.survey_calculation_index)
-                    else ""
-                )
-                field_default = (
-                    str(feature.attribute(self.survey_default_index)).strip()
-                    if self.survey_default_index >= 0
-                    and feature.attribute(self.survey_default_index)
-                    else ""
-                )
+                field_calculation = row_value(row, self.survey_calculation_index)
+                field_default = row_value(row, self.survey_default_index)
                 if field_calculation != "":
-                    current_layer[-1].setDefaultValueDefinition(
+                    frame.layer.setDefaultValueDefinition(
                         field_index,
                         QgsDefaultValue(
                             self.convert_expression(field_calculation),
-                            feature_type == "calculate" or feature_type == "hidden",
+                            feature_type in self.CALCULATED_TYPES,
                         ),
                     )
                 elif field_default != "":
+                    # last-saved references can sit anywhere in a dynamic default,
+                    # a prefix test would turn them into quoted string literals
                     if "${last-saved" not in field_default:
-                        is_digit = field_default.replace(".", "", 1).isdigit()
-                        current_layer[-1].setDefaultValueDefinition(
+                        frame.layer.setDefaultValueDefinition(
                             field_index,
                             QgsDefaultValue(
                                 field_default
-                                if is_digit
+                                if is_number(field_default)
                                 else "'{}'".format(field_default),
                                 False,
                             ),
                         )
 
                 # project-wide max-pixels handling
-                if feature_type == "image" and self.survey_parameters_index >= 0:
-                    parameters = str(feature.attribute(self.survey_parameters_index))
-                    image_max_pixels = re.search(
-                        r"max-pixels=\s*([0-9]+)", parameters, flags=re.IGNORECASE
-                    )
+                if (
+                    feature_type == "image"
+                    and has_parameters
+                    and not settings_max_pixels_mixed
+                ):
+                    parameters = row_value(row, self.survey_parameters_index)
+                    image_max_pixels = self.MAX_PIXELS_RE.search(parameters)
                     image_max_pixels = (
                         int(image_max_pixels.group(1)) if image_max_pixels else 0
                     )
@@ -1620,90 +1769,95 @@ class XLSFormConverter(QObject):
                                 settings_max_pixels = max(
                                     settings_max_pixels, image_max_pixels
                                 )
-                                self.warning.emit(
+                                self.warn_once(
                                     self.tr(
                                         "Due to the presence of a mix of image attributes having max-pixels parameter of varying values, the largest max-pixels value will be applied"
                                     )
                                 )
                         else:
-                            self.warning.emit(
+                            self.warn_once(
                                 self.tr(
                                     "Due to the presence of a mix of image attributes having defined and undefined max-pixels parameter, the parameter has been ignored"
                                 )
                             )
+                            settings_max_pixels_mixed = True
                     elif settings_max_pixels >= 0:
                         # image with missing max-pixels, prevent maximum value
                         if settings_max_pixels > 0:
-                            self.warning.emit(
+                            self.warn_once(
                                 self.tr(
                                     "Due to the presence of a mix of image attributes having defined and undefined max-pixels parameter, the parameter has been ignored"
                                 )
                             )
+                            settings_max_pixels_mixed = True
                         settings_max_pixels = -1
 
-            elif (
-                feature_type == "geopoint"
-                or feature_type == "geotrace"
-                or feature_type == "geoshape"
-                or feature_type == "start-geopoint"
-                or feature_type == "start-geotrace"
-                or feature_type == "start-geoshape"
-            ):
+            elif feature_type in self.GEOMETRY_TYPES:
+                # Geometry questions are carried by the layer geometry
                 continue
             else:
-                type_details = str(feature.attribute(self.survey_type_index)).split(" ")
-                type_details[0] = type_details[0].lower()
-                if (
-                    type_details[0] not in self.FIELD_TYPES
-                    and type_details[0] not in self.METADATA_TYPES
-                ):
-                    self.warning.emit(
+                if type_details[0] not in self.SUPPORTED_TYPES:
+                    self.warn_once(
                         self.tr("Unsupported type {}, skipping".format(feature_type))
                     )
 
-        current_layer[0].setEditFormConfig(current_editor_form[0])
+        survey_frame.layer.setEditFormConfig(survey_frame.form)
 
         if settings_max_pixels > 0:
             self.output_project.writeEntry(
                 "qfieldsync", "maximumImageWidthHeight", settings_max_pixels
             )
 
-        output_project_file = str(
-            os.path.join(output_directory, settings_filename + ".qgz")
-        )
-        self.output_project.writeProject.connect(self.process_project_write)
-        self.output_project.write(output_project_file)
-
         survey_extent = None
-        if (
-            self.geometries
-            and current_layer[0].geometryType() != Qgis.GeometryType.Null
-            and current_layer[0].geometryType() != Qgis.GeometryType.Unknown
+        survey_geometry_type = survey_frame.layer.geometryType()
+        if self.geometries and survey_geometry_type not in (
+            Qgis.GeometryType.Null,
+            Qgis.GeometryType.Unknown,
         ):
-            if current_layer[0].geometryType() == QgsWkbTypes.geometryType(
+            if survey_geometry_type == QgsWkbTypes.geometryType(
                 self.geometries.wkbType()
             ):
-                current_layer[0].startEditing()
-
                 request = QgsFeatureRequest()
                 request.setDestinationCrs(
-                    current_layer[0].crs(), self.output_project.transformContext()
+                    survey_frame.layer.crs(), self.output_project.transformContext()
                 )
-                geometries_iterator = self.geometries.getFeatures(request)
-                for feature in geometries_iterator:
-                    output_features = QgsVectorLayerUtils.makeFeatureCompatible(
-                        feature,
-                        current_layer[0],
-                        QgsFeatureSink.SinkFlag.RegeneratePrimaryKey,
+                # Only fetch the attributes makeFeatureCompatible can carry over by name
+                survey_field_names = set(survey_frame.layer.fields().names())
+                copied_field_names = [
+                    name
+                    for name in self.geometries.fields().names()
+                    if name in survey_field_names
+                ]
+                if copied_field_names:
+                    request.setSubsetOfAttributes(
+                        copied_field_names, self.geometries.fields()
                     )
-                    if output_features:
-                        current_layer[0].addFeature(
-                            output_features[0], QgsFeatureSink.Flag.FastInsert
+                else:
+                    request.setNoAttributes()
+                geometries_features = [
+                    output_features[0]
+                    for output_features in (
+                        QgsVectorLayerUtils.makeFeatureCompatible(
+                            feature,
+                            survey_frame.layer,
+                            QgsFeatureSink.SinkFlag.RegeneratePrimaryKey,
                         )
+                        for feature in self.geometries.getFeatures(request)
+                    )
+                    if output_features
+                ]
+
+                # Write straight to the provider, the layer edit buffer is not needed
+                provider = survey_frame.layer.dataProvider()
+
+                assert provider is not None
 
-                current_layer[0].commitChanges()
-                if not current_layer[0].extent().isEmpty():
-                    survey_extent = current_layer[0].extent()
+                provider.addFeatures(
+                    geometries_features, QgsFeatureSink.Flag.FastInsert
+                )
+                survey_frame.layer.updateExtents()
+                if not survey_frame.layer.extent().isEmpty():
+                    survey_extent = survey_frame.layer.extent()
             else:
                 self.warning.emit(
                     self.tr(
@@ -1715,7 +1869,7 @@ class XLSFormConverter(QObject):
             survey_extent = self.extent
         elif survey_extent:
             transform = QgsCoordinateTransform(
-                current_layer[0].crs(),
+                survey_frame.layer.crs(),
                 self.output_project.crs(),
                 self.output_project.transformContext(),
             )
@@ -1727,15 +1881,22 @@ class XLSFormConverter(QObject):
                     != Qgis.DistanceUnit.Degrees
                 ):
                     # Insure the initial project extent is not too zoomed in
-                    if survey_extent.width() < 200:
-                        padding = (200 - survey_extent.width()) / 2
-                        survey_extent.setXMinimum(survey_extent.xMinimum() - padding)
-                        survey_extent.setXMaximum(survey_extent.xMaximum() + padding)
-                    if survey_extent.height() < 200:
-                        padding = (200 - survey_extent.height()) / 2
-                        survey_extent.setYMinimum(survey_extent.yMinimum() - padding)
-                        survey_extent.setYMaximum(survey_extent.yMaximum() + padding)
-
+                    x_minimum = survey_extent.xMinimum()
+                    x_maximum = survey_extent.xMaximum()
+                    y_minimum = survey_extent.yMinimum()
+                    y_maximum = survey_extent.yMaximum()
+                    if x_maximum - x_minimum < 200:
+                        padding = (200 - (x_maximum - x_minimum)) / 2
+                        x_minimum -= padding
+                        x_maximum += padding
+                    if y_maximum - y_minimum < 200:
+                        padding = (200 - (y_maximum - y_minimum)) / 2
+                        y_minimum -= padding
+                        y_maximum += padding
+
+                    survey_extent = QgsRectangle(
+                        x_minimum, y_minimum, x_maximum, y_maximum
+                    )
                     survey_extent.scale(1.05)
                     self.output_extent = survey_extent
             except QgsCsException:
@@ -1745,29 +1906,7 @@ class XLSFormConverter(QObject):
             if self.output_project.crs().authid() == "EPSG:3857":
                 survey_extent = QgsRectangle(-9.88, 33.41, 40.97, 61.11)
             else:
-                survey_extent = self.output_project.crs().bounds()
-                if survey_extent.width() < survey_extent.height():
-                    survey_extent.setYMinimum(
-                        survey_extent.yMinimum()
-                        + survey_extent.height() / 2
-                        - survey_extent.width() / 2
-                    )
-                    survey_extent.setYMaximum(
-                        survey_extent.yMinimum()
-                        + survey_extent.height() / 2
-                        + survey_extent.width() / 2
-                    )
-                else:
-                    survey_extent.setXMinimum(
-                        survey_extent.xMinimum()
-                        + survey_extent.width() / 2
-                        - survey_extent.height() / 2
-                    )
-                    survey_extent.setXMaximum(
-                        survey_extent.xMinimum()
-                        + survey_extent.width() / 2
-                        + survey_extent.height() / 2
-                    )
+                survey_extent = square_extent(self.output_project.crs().bounds())
 
             transform = QgsCoordinateTransform(
                 QgsCoordinateReferenceSystem("EPSG:4326"),
@@ -1778,6 +1917,9 @@ class XLSFormConverter(QObject):
 
         self.output_extent = survey_extent
 
+        self.validate_pending_expressions()
+        self.defer_expression_validation = False
+
         # Set QField state to digitize when first opening the generated project
         self.output_project.writeEntry("qfieldsync", "initialMapMode", "digitize")
 
@@ -1797,13 +1939,7 @@ class XLSFormConverter(QObject):
                 QgsCoordinateReferenceSystem("EPSG:4326")
             )
 
-        output_project_file = str(
-            os.path.join(output_directory, settings_filename + ".qgz")
-        )
-        self.output_project.writeProject.connect(self.process_project_write)
-        self.output_project.write(output_project_file)
-
-        return output_project_file
+        return self.persist_project(output_directory, settings_filename)
 
 
 def main():
@@ -1833,7 +1969,8 @@ def main_cli():
         print(f"Failed to start QGIS application: {e}")
         sys.exit(1)
     finally:
-        stop_app()
+        # the process ends right after, a full garbage collection is wasted work
+        stop_app(collect_garbage=False)
 
 
 if __name__ == "__main__":
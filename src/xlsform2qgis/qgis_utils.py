@@ -2,6 +2,7 @@ import atexit
 import gc
 import logging
 import os
+import stat
 import tempfile
 
 from qgis.core import QgsApplication, Qgis, QgsProject
@@ -13,6 +14,35 @@ logger = logging.getLogger(__name__)
 QGISAPP: QgsApplication | None = None
 
 
+def get_config_path() -> str:
+    """
+    Returns a QGIS configuration directory private to the current user, reused
+    between runs so QGIS can keep its caches. It lives in the user cache directory,
+    falling back to a fresh temporary directory when that one is not usable.
+
+        Returns
+        -------
+        str: path to the QGIS configuration directory.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    config_path = os.path.join(cache_home, "xlsform2qgis", "qgis-config")
+
+    try:
+        os.makedirs(config_path, mode=0o700, exist_ok=True)
+        config_stat = os.lstat(config_path)
+    except OSError:
+        return tempfile.mkdtemp("", "QGIS_CONFIG")
+
+    if stat.S_ISLNK(config_stat.st_mode) or (
+        hasattr(os, "getuid") and config_stat.st_uid != os.getuid()
+    ):
+        return tempfile.mkdtemp("", "QGIS_CONFIG")
+
+    return config_path
+
+
 def start_app() -> str:
     """
     Will start a QgsApplication and call all initialization code like
@@ -39,7 +69,8 @@ def start_app() -> str:
         )
         argvb: list[str] = []
 
-        os.environ["QGIS_CUSTOM_CONFIG_PATH"] = tempfile.mkdtemp("", "QGIS_CONFIG")
+        if "QGIS_CUSTOM_CONFIG_PATH" not in os.environ:
+            os.environ["QGIS_CUSTOM_CONFIG_PATH"] = get_config_path()
 
         # Note: QGIS_PREFIX_PATH is evaluated in QgsApplication -
         # no need to mess with it here.
@@ -51,16 +82,23 @@ def start_app() -> str:
         # make sure the app is closed, otherwise the container exists with non-zero
         @atexit.register
         def exitQgis():
-            stop_app()
+            # the process is about to end, a full garbage collection is wasted work
+            stop_app(collect_garbage=False)
 
         logger.info("QGIS app started!")
 
     return Qgis.version()
 
 
-def stop_app():
+def stop_app(collect_garbage: bool = True):
     """
-    Cleans up and exits QGIS
+    Cleans up and exits QGIS. Once QGIS has exited, further calls do nothing, so it is
+    safe to stop the app explicitly before the exit hook runs.
+
+        Parameters
+        ----------
+        collect_garbage: bool
+            Whether to force a garbage collection before exiting QGIS.
     """
     global QGISAPP
 
@@ -78,7 +116,8 @@ def stop_app():
         logger.info("Stopping QGIS app…")
 
         # NOTE we force run the GB just to make sure there are no dangling QGIS objects when we delete the QGIS application
-        gc.collect()
+        if collect_garbage:
+            gc.collect()
 
         QGISAPP.exitQgis()
 
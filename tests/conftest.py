@@ -0,0 +1,23 @@
+import pytest
+from qgis.core import QgsProject
+
+from xlsform2qgis.qgis_utils import start_app, stop_app
+
+
+@pytest.fixture(scope="session", autouse=True)
+def qgis_app():
+    start_app()
+    yield
+    # the atexit hook registered by start_app() calls stop_app() again, which is a no-op
+    stop_app()
+
+
+@pytest.fixture(autouse=True)
+def clear_project():
+    project = QgsProject.instance()
+
+    assert project
+
+    project.clear()
+    yield
+    project.clear()
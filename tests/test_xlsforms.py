@@ -3,9 +3,16 @@ import pytest
 from pathlib import Path
 from qgis.core import (
     Qgis,
+    QgsCoordinateReferenceSystem,
     QgsProject,
+    QgsRectangle,
+)
+from xlsform2qgis.converter import (
+    XLSFormConverter,
+    is_number,
+    square_extent,
+    strip_tags,
 )
-from xlsform2qgis.converter import XLSFormConverter, strip_tags
 
 
 class TestHTMLStripper:
@@ -21,6 +28,46 @@ class TestHTMLStripper:
     def test_strip_tags_empty(self):
         assert strip_tags("") == ""
 
+    def test_strip_tags_entities(self):
+        assert strip_tags("Fish &amp; Chips") == "Fish & Chips"
+
+
+class TestIsNumber:
+    def test_is_number_digits(self):
+        assert is_number("42")
+        assert is_number("4.2")
+        assert is_number(".5")
+
+    def test_is_number_text(self):
+        assert not is_number("")
+        assert not is_number(".")
+        assert not is_number("1.2.3")
+        assert not is_number("-1")
+        assert not is_number("yes")
+
+
+class TestSquareExtent:
+    def test_square_extent_wide(self):
+        extent = square_extent(QgsRectangle(0, 10, 8, 14))
+
+        assert extent == QgsRectangle(2, 10, 6, 14)
+
+    def test_square_extent_tall(self):
+        extent = square_extent(QgsRectangle(0, 0, 4, 10))
+
+        assert extent == QgsRectangle(0, 3, 4, 7)
+
+    def test_square_extent_crs_bounds(self):
+        # Swiss CH1903+ / LV95 bounds are wider than they are tall
+        bounds = QgsCoordinateReferenceSystem("EPSG:2056").bounds()
+        extent = square_extent(bounds)
+
+        assert bounds.width() > bounds.height()
+        assert extent.width() == pytest.approx(bounds.height())
+        assert extent.height() == pytest.approx(bounds.height())
+        assert extent.center().x() == pytest.approx(bounds.center().x())
+        assert extent.center().y() == pytest.approx(bounds.center().y())
+
 
 class TestXLSFormConverter:
     @pytest.fixture
@@ -113,6 +160,12 @@ class TestXLSFormConverter:
 
         assert result == """'' || "field1" || ' and ' || "field2" || ''"""
 
+    def test_convert_label_expression_apostrophe(self, xlsform_file):
+        converter = XLSFormConverter(xlsform_file)
+        result = converter.convert_label_expression("it's ${field_name}")
+
+        assert result == """'it\\'s ' || "field_name" || ''"""
+
     def test_convert_expression_apostrophe_replacement(self, xlsform_file):
         converter = XLSFormConverter(xlsform_file)
         result = converter.convert_expression("it's a test")
@@ -130,3 +183,124 @@ class TestXLSFormConverter:
         result = converter.convert_expression("today()")
 
         assert result == "format_date(now(),'yyyy-MM-dd')"
+
+    def test_warn_once(self, xlsform_file):
+        converter = XLSFormConverter(xlsform_file)
+        warnings = []
+        converter.warning.connect(warnings.append)
+
+        converter.warn_once("first")
+        converter.warn_once("first")
+        converter.warn_once("second")
+
+        assert warnings == ["first", "second"]
+
+    def test_convert_expression_invalid_warns(self, xlsform_file):
+        converter = XLSFormConverter(xlsform_file)
+        warnings = []
+        converter.warning.connect(warnings.append)
+
+        converter.convert_expression("${field} +")
+
+        assert warnings == ["Unsupported expression ${field} +"]
+
+    def test_convert_reordered_choices_columns(self, temp_dir):
+        xlsform_file = str(Path(__file__).parent / "data/reordered_choices.xlsx")
+        converter = XLSFormConverter(xlsform_file)
+
+        assert converter.choices_list_name_index == 2
+        assert converter.choices_name_index == 1
+        assert converter.choices_label_index == 0
+
+        converter.convert(str(temp_dir))
+
+        list_layer = converter.output_project.mapLayersByName("list_colors")[0]
+        labels = {
+            feature["name"]: feature["label"] for feature in list_layer.getFeatures()
+        }
+
+        assert labels == {"": "", "red": "Red", "blue": "Blue"}
+
+        survey_layer = converter.output_project.mapLayersByName("survey")[0]
+        widget = survey_layer.editorWidgetSetup(survey_layer.fields().indexOf("color"))
+
+        assert widget.type() == "ValueRelation"
+        assert widget.config()["Layer"] == list_layer.id()
+        assert widget.config()["Key"] == "name"
+        assert widget.config()["Value"] == "label"
+
+    def test_convert_select_one_from_file(self, temp_dir):
+        xlsform_file = str(Path(__file__).parent / "data/select_from_file.xlsx")
+        converter = XLSFormConverter(xlsform_file)
+
+        converter.convert(str(temp_dir))
+
+        assert (temp_dir / "items.csv").is_file()
+
+        list_layer = converter.output_project.mapLayersByName("list_items.csv")[0]
+
+        assert list_layer.isValid()
+        assert list_layer.featureCount() == 2
+
+        survey_layer = converter.output_project.mapLayersByName("survey")[0]
+        widget = survey_layer.editorWidgetSetup(survey_layer.fields().indexOf("item"))
+
+        assert widget.type() == "ValueRelation"
+        assert widget.config()["Layer"] == list_layer.id()
+        assert widget.config()["Key"] == "name"
+        assert widget.config()["Value"] == "label"
+        assert not widget.config()["AllowMulti"]
+
+    def test_convert_group_in_repeat_in_group(self, temp_dir):
+        xlsform_file = str(Path(__file__).parent / "data/nested_groups.xlsx")
+        converter = XLSFormConverter(xlsform_file)
+        converter.set_groups_as_tabs(True)
+
+        converter.convert(str(temp_dir))
+
+        survey_layer = converter.output_project.mapLayersByName("survey")[0]
+        survey_tab, outer = (
+            survey_layer.editFormConfig().invisibleRootContainer().children()
+        )
+
+        assert [child.name() for child in survey_tab.children()] == ["fourth"]
+        assert outer.name() == "Outer"
+        assert outer.type() == Qgis.AttributeEditorContainerType.Tab
+        assert [child.name() for child in outer.children()] == [
+            "first",
+            "visits",
+            "third",
+        ]
+
+        # The repeat form tracks its own group level, its first group is a tab again
+        visits_layer = converter.output_project.mapLayersByName("visits")[0]
+        visits_tab, inner = (
+            visits_layer.editFormConfig().invisibleRootContainer().children()
+        )
+
+        assert visits_tab.children() == []
+        assert inner.name() == "Inner"
+        assert inner.type() == Qgis.AttributeEditorContainerType.Tab
+
+        (nested,) = inner.children()
+
+        assert nested.name() == "Nested"
+        assert nested.type() == Qgis.AttributeEditorContainerType.GroupBox
+        assert [child.name() for child in nested.children()] == ["second"]
+
+
+def test_main_cli_skips_garbage_collection(monkeypatch):
+    from xlsform2qgis import converter, qgis_utils
+
+    collect_garbage_calls = []
+    monkeypatch.setattr(qgis_utils, "start_app", lambda: None)
+    monkeypatch.setattr(
+        qgis_utils,
+        "stop_app",
+        lambda collect_garbage=True: collect_garbage_calls.append(collect_garbage),
+    )
+    monkeypatch.setattr(converter, "main", lambda: None)
+
+    converter.main_cli()
+
+    assert collect_garbage_calls == [False]